@@ -1,21 +1,59 @@
 from did_sw.estimator import (
     estimate,
+    estimate_from_parquet,
+    compress_units,
     assign_weights_agg,
     assign_weights_horizon,
+    assign_weights_sparse,
+    aggregate_sparse,
+    sparse_weights_from_columns,
     rename_horizons,
     DidSwResult,
 )
-from did_sw import comparison, sim, utils
+from did_sw.incremental import SwddState, estimate_rolling
+from did_sw.plan import EstimationPlan, Spec
+from did_sw import (
+    cache,
+    closed_form,
+    comparison,
+    encoding,
+    fixed_effects,
+    incremental,
+    plan,
+    prep,
+    sim,
+    sorting,
+    utils,
+    validate,
+)
 
 __all__ = [
+    "cache",
+    "closed_form",
     "comparison",
+    "encoding",
     "estimate",
+    "estimate_from_parquet",
+    "estimate_rolling",
+    "compress_units",
     "DidSwResult",
+    "EstimationPlan",
+    "Spec",
+    "SwddState",
     "assign_weights_agg",
     "assign_weights_horizon",
+    "assign_weights_sparse",
+    "aggregate_sparse",
+    "sparse_weights_from_columns",
     "rename_horizons",
+    "fixed_effects",
+    "incremental",
+    "plan",
+    "prep",
     "sim",
+    "sorting",
     "utils",
+    "validate",
 ]
 
 __version__ = "0.0.1-dev"
@@ -0,0 +1,320 @@
+"""
+Caching of the preprocessing stages and results of the SWDD estimator.
+
+Cached stages are keyed by a fingerprint of the input frame together with the
+arguments of the stage and evicted in least-recently-used order once the
+estimated size of the cached frames exceeds a byte budget. `LRUCache` keeps
+the stages of a process in memory, while `DiskCache` persists whole results
+in a directory shared by processes.
+"""
+
+import contextlib
+import glob
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterator
+from pathlib import Path
+from typing import Any
+
+import polars as pl
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+
+__all__ = [
+    "DiskCache",
+    "LRUCache",
+    "default_cache",
+    "file_fingerprint",
+    "fingerprint",
+    "hash_key",
+]
+
+# Bump when the layout of the cached results changes
+CACHE_VERSION = 1
+
+
+def fingerprint(df: pl.DataFrame) -> str:
+    """Fingerprint of the schema and content of a frame.
+
+    Hashes the row hashes of `df`, which is a single vectorized pass over the
+    data and much cheaper than the sort and window computations of the prep.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(df.schema).encode())
+    h.update(repr(df.shape).encode())
+    if df.width > 0:
+        h.update(df.hash_rows(seed=0).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def file_fingerprint(source: str | Path | list[str] | list[Path]) -> str:
+    """Fingerprint of the files of `source` from their path, size and mtime.
+
+    Globs are expanded as by the scans of polars; the files are not read, so
+    a rewritten file is only detected through its size or modification time.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for pattern in source if isinstance(source, list) else [source]:
+        paths = sorted(glob.glob(str(pattern))) or [str(pattern)]
+        for path in paths:
+            stat = os.stat(path)
+            h.update(repr((os.path.abspath(path), stat.st_size)).encode())
+            h.update(repr(stat.st_mtime_ns).encode())
+    return h.hexdigest()
+
+
+def hash_key(*parts: Any) -> str:
+    """Key of a persistent cache entry from the `repr` of `parts`.
+
+    The key includes the polars version, since the row hashes of
+    `fingerprint` are only stable within a version.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((CACHE_VERSION, pl.__version__, *parts)).encode())
+    return h.hexdigest()
+
+
+def _nbytes(value: Any) -> int:
+    match value:
+        case pl.DataFrame():
+            return value.estimated_size()
+        case tuple() | list():
+            return sum(_nbytes(v) for v in value)
+        case _:
+            return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by the estimated size of its values.
+
+    Args:
+        max_bytes: Byte budget of the cached values; values larger than the
+            budget are not cached.
+        max_entries: Maximum number of cached values.
+    """
+
+    def __init__(self, max_bytes: int = 2**30, max_entries: int = 1024):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._data: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    @property
+    def nbytes(self) -> int:
+        """Estimated size of the cached values."""
+        return self._nbytes
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key][0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = _nbytes(value)
+        with self._lock:
+            if key in self._data:
+                self._nbytes -= self._data.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._data[key] = (value, size)
+            self._nbytes += size
+            while self._nbytes > self.max_bytes or len(self._data) > self.max_entries:
+                self._nbytes -= self._data.popitem(last=False)[1][1]
+
+    def get_or_compute(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Cached value of `key` or the value of `fn()`, which is cached."""
+        value = self.get(key)
+        if value is None:
+            value = fn()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+
+default_cache = LRUCache()
+
+
+class _Pickler(pickle.Pickler):
+    """Pickles frames and series as Arrow IPC files next to the pickle."""
+
+    def __init__(self, file, directory: Path):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.directory = directory
+        self.n = 0
+
+    def persistent_id(self, obj: Any) -> tuple[str, str] | None:
+        match obj:
+            case pl.DataFrame():
+                kind, frame = "frame", obj
+            case pl.Series():
+                kind, frame = "series", obj.to_frame()
+            case _:
+                return None
+        name = f"{self.n}.arrow"
+        self.n += 1
+        frame.write_ipc(self.directory / name, compression="lz4")
+        return kind, name
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, directory: Path):
+        super().__init__(file)
+        self.directory = directory
+
+    def persistent_load(self, pid: tuple[str, str]) -> pl.DataFrame | pl.Series:
+        kind, name = pid
+        frame = pl.read_ipc(self.directory / name)
+        return frame if kind == "frame" else frame.to_series()
+
+
+class DiskCache:
+    """Persistent LRU cache of results in a directory shared by processes.
+
+    Each entry is a directory with the frames of the value as Arrow IPC files
+    and the rest of the value pickled; entries are written to a temporary
+    directory and renamed into place, so readers never see partial entries.
+    Reads hold a shared and writes an exclusive lock on `directory/.lock`,
+    such that concurrent worker processes can share the directory. Once the
+    entries exceed `max_bytes` on disk, the least recently read are removed.
+    Only use directories you trust, since the entries are unpickled.
+
+    Args:
+        directory: Directory of the cache (created if missing).
+        max_bytes: Byte budget of the entries on disk.
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int = 2**32):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def of(cls, cache: "str | Path | DiskCache") -> "DiskCache":
+        """`cache` itself or a cache in the directory `cache`."""
+        return cache if isinstance(cache, DiskCache) else cls(cache)
+
+    def __len__(self) -> int:
+        with self._lock(shared=True):
+            return len(self._entries())
+
+    def __contains__(self, key: str) -> bool:
+        return (self.directory / key / "value.pkl").exists()
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the entries on disk."""
+        with self._lock(shared=True):
+            return sum(size for _, _, size in self._entries())
+
+    @contextlib.contextmanager
+    def _lock(self, shared: bool) -> Iterator[None]:
+        with open(self.directory / ".lock", "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            else:  # pragma: no cover - Windows locks are exclusive
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:  # pragma: no cover
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _entries(self) -> list[tuple[Path, int, int]]:
+        """(path, last read in ns, size) of the entries."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            files = list(os.scandir(entry.path))
+            value = Path(entry.path) / "value.pkl"
+            if not value.exists():
+                continue
+            size = sum(f.stat().st_size for f in files)
+            entries.append((Path(entry.path), value.stat().st_mtime_ns, size))
+        return entries
+
+    def get(self, key: str) -> Any | None:
+        entry = self.directory / key
+        with self._lock(shared=True):
+            try:
+                with open(entry / "value.pkl", "rb") as f:
+                    value = _Unpickler(f, entry).load()
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            # The modification time of the pickle orders the entries by use
+            os.utime(entry / "value.pkl")
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=self.directory))
+        try:
+            with open(tmp / "value.pkl", "wb") as f:
+                _Pickler(f, tmp).dump(value)
+            with self._lock(shared=False):
+                if key not in self:
+                    shutil.rmtree(self.directory / key, ignore_errors=True)
+                    os.rename(tmp, self.directory / key)
+                self._evict()
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def get_or_compute(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Cached value of `key` or the value of `fn()`, which is cached."""
+        value = self.get(key)
+        if value is None:
+            value = fn()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock(shared=False):
+            for path, _, _ in self._entries():
+                shutil.rmtree(path, ignore_errors=True)
+        self.hits = 0
+        self.misses = 0
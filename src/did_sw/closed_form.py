@@ -0,0 +1,427 @@
+"""
+Closed-form SWDD estimator for time fixed effects without covariates.
+
+With `fes=time` the imputation regression of BJS on the untreated
+first-differenced outcomes reduces to period means, i.e. the imputed
+counterfactual of a treated observation in period t is the mean of `dY` over
+the untreated observations in period t. The SWDD estimates are then weighted
+sums of the imputed treatment effects and can be computed with group-by
+aggregations without fitting a regression model.
+
+The standard errors are the conservative clustered standard errors of
+Borusyak, Jaravel & Spiess (2024), computed from per-cluster sums of the
+weighted residuals. The same per-cluster sums give a multiplier (wild
+cluster) bootstrap as a single product of a matrix of cluster multipliers
+with the matrix of the sums.
+"""
+
+from statistics import NormalDist
+from typing import Literal
+
+import numpy as np
+import polars as pl
+
+from did_sw.prep import no_controls_error, unique
+
+
+__all__ = [
+    "is_closed_form",
+    "treated",
+    "period_means",
+    "impute_effects",
+    "influence",
+    "inference",
+    "multipliers",
+    "bootstrap",
+    "leave_out_estimates",
+]
+
+
+def is_closed_form(
+    time: str,
+    fes: str | None,
+    covariates: list[str] | None,
+) -> bool:
+    """Whether the specification only has time fixed effects."""
+    return fes is not None and fes.replace(" ", "") == time and not covariates
+
+
+def treated() -> pl.Expr:
+    """Treatment indicator; observations with K >= 0 are treated."""
+    return pl.col("K").ge(0).fill_null(False)
+
+
+def period_means(
+    data: pl.DataFrame | pl.LazyFrame,
+    time: str,
+    outcome: str = "dY",
+) -> pl.DataFrame:
+    """Imputed counterfactual `Yhat` of each period with untreated observations.
+
+    The counterfactual is the mean outcome of the untreated observations in
+    the period weighted by `iwtr`, accumulated in float64.
+    """
+    y, w = pl.col(outcome).cast(pl.Float64), pl.col("iwtr").cast(pl.Float64)
+    return (
+        data.lazy()
+        .filter(treated().not_())
+        .group_by(time)
+        .agg(Yhat=y.mul(w).sum() / w.sum())
+        .collect()
+    )
+
+
+def impute_effects(
+    data: pl.DataFrame,
+    time: str,
+    outcome: str = "dY",
+) -> pl.DataFrame:
+    """Imputes the treatment effects with time fixed effects.
+
+    Adds the columns `Yhat` (mean outcome of untreated observations in the
+    period weighted by `iwtr`) and `Yadj` (outcome minus `Yhat`), the same columns as
+    `did_imp.compute_tes`. The effects of treated observations in periods
+    without untreated observations are not identified and raise a
+    `ValueError`.
+    """
+    tes = (
+        data.lazy()
+        .join(
+            period_means(data, time, outcome).lazy(),
+            on=time,
+            how="left",
+            maintain_order="left",
+        )
+        .with_columns(Yadj=pl.col(outcome).sub(pl.col("Yhat")))
+        .collect()
+    )
+    missing = tes.filter(treated(), pl.col("Yhat").is_null())[time].unique().sort()
+    if missing.len():
+        raise no_controls_error(missing.to_list())
+    return tes
+
+
+def influence(
+    tes: pl.DataFrame,
+    weights: pl.DataFrame,
+    time: str,
+    group: str,
+    cluster: str,
+    untreated: pl.LazyFrame | None = None,
+    projection: pl.DataFrame | None = None,
+) -> pl.DataFrame:
+    """Per-cluster influence contributions of each term.
+
+    For a term with weights w the variance estimator of BJS is
+    sum_c (sum_{it in c} v_it * e_it)^2, where v_it = w_it for treated
+    observations and v_it = -iwtr_it * (sum of w over treated in t) / N0_t for
+    untreated observations with time fixed effects, where N0_t is the sum of
+    `iwtr` over untreated observations in t. The residuals e_it are the
+    imputation residuals for untreated observations and the imputed effects
+    minus their average within (cohort, horizon) for treated observations.
+
+    Args:
+        tes: Output of `impute_effects` with a `row` index column.
+        weights: (row, term, weight) triplet table.
+        time: Time column.
+        group: Cohort column.
+        cluster: Cluster column.
+        untreated: Untreated observations with columns (time, cluster, iwtr,
+            Yadj); defaults to the untreated rows of `tes`.
+        projection: Weights v_it of the untreated rows (term, row, v) for
+            other fixed effects than time, see `fixed_effects.projection`.
+
+    Returns:
+        DataFrame with columns (term, cluster, psi); the standard error of a
+        term is the square root of the sum of squared `psi`.
+    """
+    # Sums are accumulated in float64 also for float32 weights
+    treated_w = (
+        weights.lazy()
+        .with_columns(pl.col("weight").cast(pl.Float64))
+        .join(
+            tes.lazy().select(unique(["row", time, group, "K", cluster, "Yadj"])),
+            on="row",
+            how="left",
+        )
+    )
+    cell = ["term", group, "K"]
+    psi_treated = (
+        treated_w.with_columns(
+            # Weight of each observation's cluster within (cohort, horizon)
+            sw=pl.col("weight").sum().over(*cell, cluster).mul(pl.col("weight"))
+        )
+        .with_columns(
+            tau_bar=pl.col("Yadj").mul("sw").sum().over(cell)
+            / pl.col("sw").sum().over(cell)
+        )
+        .group_by("term", cluster)
+        .agg(psi=pl.col("weight").mul(pl.col("Yadj").sub("tau_bar")).sum())
+    )
+
+    if untreated is None:
+        untreated = tes.lazy().filter(treated().not_())
+    if projection is not None:
+        psi_untreated = (
+            untreated.select("row", cluster, "Yadj")
+            .join(projection.lazy(), on="row")
+            .group_by("term", cluster)
+            .agg(psi=pl.col("v").mul("Yadj").sum())
+        )
+    else:
+        v_untreated = (
+            treated_w.group_by("term", time)
+            .agg(W=pl.col("weight").sum())
+            .join(
+                untreated.group_by(time).agg(N0=pl.col("iwtr").sum()),
+                on=time,
+                how="inner",
+            )
+            .select("term", time, v=pl.col("W").neg().truediv("N0"))
+        )
+        psi_untreated = (
+            untreated.group_by(unique([cluster, time]))
+            .agg(e=pl.col("Yadj").mul("iwtr").sum())
+            .join(v_untreated, on=time, how="inner")
+            .group_by("term", cluster)
+            .agg(psi=pl.col("v").mul("e").sum())
+        )
+    return (
+        pl.concat([psi_treated, psi_untreated])
+        .group_by("term", cluster)
+        .agg(pl.col("psi").sum())
+        .sort("term", cluster)
+        .collect()
+    )
+
+
+def leave_out_estimates(
+    data: pl.DataFrame,
+    time: str,
+    by: str,
+    horizons: list[int],
+    average: bool = False,
+    outcome: str = "dY",
+) -> pl.DataFrame:
+    """Estimates of the horizons leaving out each group of `by` in turn.
+
+    With time fixed effects the estimate of a term is
+    sum_t (A_t - B_t * Yhat_t) / n, where A_t and B_t are the weighted sums
+    of the outcome and of `iwtr` of the treated rows of the term in period
+    t, Yhat_t = S_t / N_t the mean outcome of the untreated rows and n the
+    normalizing sum of the weights. All of these are sums over rows, so the
+    estimates without a group follow from subtracting the sums of the group
+    from the totals (downdating) instead of refitting without the group.
+
+    Args:
+        data: Prepared data with columns K, maxK, iwtr and `outcome`.
+        by: Column to leave out groups of; must be constant within units
+            (e.g. the cohort or the cluster).
+        horizons: Horizons of the terms `{h}`.
+        average: Whether to add the aggregate effect (term `average`).
+
+    Returns:
+        DataFrame with columns (by, term, estimate); estimates that are not
+        identified without a group are null.
+    """
+    y, w = pl.col(outcome).cast(pl.Float64), pl.col("iwtr").cast(pl.Float64)
+    rows = data.lazy()
+    untreated = (
+        rows.filter(treated().not_())
+        .group_by(by, time)
+        .agg(S=y.mul(w).sum(), N=w.sum())
+    )
+    treated_rows = rows.filter(treated())
+    frames = [
+        treated_rows.with_columns(h=pl.int_ranges("K", pl.col("maxK").add(1)))
+        .explode("h")
+        .filter(pl.col("h").is_in(horizons))
+        .select(
+            by,
+            time,
+            term=pl.col("h").cast(pl.String),
+            a=y.mul(w),
+            b=w,
+            n=pl.col("K").eq(pl.col("h")).cast(pl.Float64).mul(w),
+            m=pl.lit(1, pl.Int64),
+        )
+    ]
+    if average:
+        # Weights (maxK - K + 1) * iwtr normalized by the sum of `iwtr`
+        scale = pl.col("maxK").sub("K").add(1).cast(pl.Float64)
+        frames.append(
+            treated_rows.select(
+                by,
+                time,
+                term=pl.lit("average"),
+                a=scale.mul(y).mul(w),
+                b=scale.mul(w),
+                n=w,
+                m=pl.lit(1, pl.Int64),
+            )
+        )
+    cells = (
+        pl.concat(frames)
+        .group_by(by, "term", time)
+        .agg(pl.col("a", "b", "n", "m").sum())
+        .collect()
+    )
+    means = untreated.collect()
+    groups = pl.concat(
+        [cells.select(by), means.select(by)], how="vertical_relaxed"
+    ).unique()
+
+    def _without(stats: pl.DataFrame, keys: list[str], cols: list[str]):
+        """Totals minus the sums of each group over `keys`."""
+        totals = stats.group_by(keys).agg(pl.col(cols).sum())
+        return (
+            groups.join(totals, how="cross")
+            .join(stats, on=[by, *keys], how="left", nulls_equal=True, suffix="_g")
+            .select(
+                by,
+                *keys,
+                *[pl.col(c).sub(pl.col(f"{c}_g").fill_null(0)) for c in cols],
+            )
+        )
+
+    yhat = _without(means, [time], ["S", "N"]).select(
+        by,
+        time,
+        Yhat=pl.when(pl.col("N").gt(0)).then(pl.col("S") / pl.col("N")),
+    )
+    return (
+        _without(cells, ["term", time], ["a", "b", "n", "m"])
+        .join(yhat, on=[by, time], how="left", nulls_equal=True)
+        .group_by(by, "term")
+        .agg(
+            num=pl.col("a").sub(pl.col("b").mul("Yhat")).sum(),
+            n=pl.col("n").sum(),
+            # Treated rows left in periods without untreated rows
+            unidentified=(pl.col("m").gt(0) & pl.col("Yhat").is_null()).any(),
+        )
+        .select(
+            by,
+            "term",
+            estimate=pl.when(pl.col("n").gt(0), pl.col("unidentified").not_()).then(
+                pl.col("num") / pl.col("n")
+            ),
+        )
+    )
+
+
+def inference(
+    estimates: pl.DataFrame,
+    psi: pl.DataFrame,
+    alpha: float = 0.05,
+) -> pl.DataFrame:
+    """Adds standard errors, t-statistics, p-values and confidence intervals.
+
+    Args:
+        estimates: DataFrame with columns (term, estimate).
+        psi: Influence contributions of `influence`.
+        alpha: Significance level of the confidence intervals.
+    """
+    se = psi.group_by("term").agg(se=pl.col("psi").pow(2).sum().sqrt())
+    res = estimates.join(se, on="term", how="left", maintain_order="left")
+    tstat = (res["estimate"] / res["se"]).to_numpy()
+    normal = NormalDist()
+    z = normal.inv_cdf(1 - alpha / 2)
+    return res.with_columns(
+        tstat=tstat,
+        pval=np.array([2 * normal.cdf(-abs(t)) for t in tstat]),
+        lower=pl.col("estimate").sub(pl.col("se").mul(z)),
+        upper=pl.col("estimate").add(pl.col("se").mul(z)),
+    )
+
+
+Multipliers = Literal["rademacher", "mammen"]
+
+
+def multipliers(
+    kind: Multipliers,
+    size: tuple[int, int],
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Draws of mean zero and unit variance multipliers.
+
+    Args:
+        kind: "rademacher" (+-1 with equal probability) or "mammen" (the
+            two-point distribution of Mammen (1993) with third moment one).
+    """
+    match kind:
+        case "rademacher":
+            return rng.choice(np.array([-1.0, 1.0]), size=size)
+        case "mammen":
+            s5 = np.sqrt(5)
+            low = rng.random(size) < (s5 + 1) / (2 * s5)
+            return np.where(low, -(s5 - 1) / 2, (s5 + 1) / 2)
+        case _:
+            raise ValueError(
+                f"Multipliers must be 'rademacher' or 'mammen'; got {kind=}"
+            )
+
+
+def bootstrap(
+    estimates: pl.DataFrame,
+    psi: pl.DataFrame,
+    cluster: str,
+    B: int = 999,
+    kind: Multipliers = "rademacher",
+    alpha: float = 0.05,
+    band: list[str] | None = None,
+    seed: int | None = None,
+    max_cells: int = 2**25,
+) -> pl.DataFrame:
+    """Adds multiplier bootstrap standard errors and uniform confidence bands.
+
+    The bootstrap draws of the estimates minus the point estimates are
+    V @ Psi, where V is the (B x clusters) matrix of multipliers and Psi the
+    (clusters x terms) matrix of influence contributions; the draws of V are
+    generated in blocks of at most `max_cells` entries. The standard errors
+    `se_boot` are the standard deviations of the draws and the band
+    (`lower_band`, `upper_band`) uses the 1 - alpha quantile of the maximum
+    absolute t-statistic over the terms of `band` (sup-t band).
+
+    Args:
+        estimates: DataFrame with columns (term, estimate).
+        psi: Influence contributions of `influence` with the terms of
+            `estimates`.
+        cluster: Cluster column of `psi`.
+        B: Number of bootstrap draws.
+        kind: Distribution of the multipliers; see `multipliers`.
+        band: Terms of the uniform band (defaults to all terms); the band
+            columns are null for other terms.
+        seed: Seed of the random number generator.
+    """
+    # Sorted clusters such that a seed assigns the same draws to each cluster
+    wide = psi.pivot(on="term", index=cluster, values="psi").fill_null(0).sort(cluster)
+    terms = [term for term in estimates["term"].to_list() if term in wide.columns]
+    scores = wide.select(terms).to_numpy()
+    rng = np.random.default_rng(seed)
+    block = max(1, max_cells // max(scores.shape[0], 1))
+    draws = np.vstack(
+        [
+            multipliers(kind, (min(block, B - b), scores.shape[0]), rng) @ scores
+            for b in range(0, B, block)
+        ]
+    )
+    se = draws.std(axis=0, ddof=1)
+
+    band = terms if band is None else [term for term in terms if term in band]
+    idx = [terms.index(term) for term in band]
+    tmax = np.abs(draws[:, idx] / np.where(se[idx] > 0, se[idx], np.nan))
+    crit = np.quantile(np.nanmax(tmax, axis=1), 1 - alpha) if idx else np.nan
+    in_band = pl.col("term").is_in(band)
+    return estimates.join(
+        pl.DataFrame({"term": terms, "se_boot": se}),
+        on="term",
+        how="left",
+        maintain_order="left",
+    ).with_columns(
+        lower_band=pl.when(in_band).then(
+            pl.col("estimate").sub(pl.col("se_boot").mul(crit))
+        ),
+        upper_band=pl.when(in_band).then(
+            pl.col("estimate").add(pl.col("se_boot").mul(crit))
+        ),
+    )
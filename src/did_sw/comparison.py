@@ -5,6 +5,7 @@ staggered treatment adoption designs as characterized by Harmon (2024).
 
 from dataclasses import dataclass
 from itertools import zip_longest
+from pathlib import Path
 from typing import Literal
 
 import numpy as np
@@ -12,6 +13,11 @@ import polars as pl
 from tabulate import tabulate
 from tqdm import tqdm
 
+from did_sw.cache import DiskCache, fingerprint, hash_key
+from did_sw.encoding import KeyEncoding
+from did_sw.sorting import sort_by
+from did_sw.validate import validate_panel
+
 
 __all__ = [
     "Comparisons",
@@ -60,7 +66,7 @@ def compare_controls(comp: "Comparisons"):
     """
     swdd = comp.swdd.select("E", "h", "C_SWDD")
     swdd = (
-        swdd.sort("E", "h")
+        sort_by(swdd, "E", "h")
         .with_columns(
             pl.col("C_SWDD").list.len().cum_sum().over("E").alias("#controls_all")
         )
@@ -92,11 +98,13 @@ class Comparisons:
     swdd: pl.DataFrame
     data: pl.DataFrame  # Original data
     id_col: str = "id"
+    encoding: KeyEncoding | None = None
 
     def __post_init__(self):
-        self.comparisons = self.comparisons.sort("E", "id", "h")
-        self.sgdd = self.sgdd.sort("E", "h")
-        self.swdd = self.swdd.sort("E", "h")
+        # Already sorted when constructed by `comparisons`
+        self.comparisons = sort_by(self.comparisons, "E", "id", "h")
+        self.sgdd = sort_by(self.sgdd, "E", "h")
+        self.swdd = sort_by(self.swdd, "E", "h")
 
     def query_comparisons(
         self,
@@ -241,11 +249,45 @@ def _swdd_condition(df: pl.DataFrame) -> pl.DataFrame:
     for each k = 0, 1, ..., h
     (i.e. both equal to 0 i.e. both observed and non-treated)
     """
-    return df.sort("E", "id", "E_h").with_columns(
+    # Sorted by (E, id, h) in `comparisons` and E_h = E + h
+    return sort_by(df, "E", "id", "E_h").with_columns(
         valid_swdd=(pl.col("D_h").eq(0) & pl.col("D_h").shift(1).eq(0)).over("id")
     )
 
 
+def _fit_encoding(data: pl.DataFrame, id_col: str = "id") -> KeyEncoding:
+    return KeyEncoding.fit(data, unit=id_col, time="t", group="E")
+
+
+def _decode_comparisons(comp: Comparisons, encoding: KeyEncoding) -> Comparisons:
+    """Decodes the tables of `comp` in place; tables are sorted on the codes."""
+    comp.comparisons = encoding.decode(comp.comparisons, periods=["E", "E_h"])
+    comp.sgdd = encoding.decode(comp.sgdd, units=["C_SGDD"], periods=["E"])
+    comp.swdd = encoding.decode(comp.swdd, units=["C_SWDD"], periods=["E"])
+    return comp
+
+
+def _encode_comparisons(comp: Comparisons) -> tuple[Comparisons, KeyEncoding]:
+    encoding = comp.encoding or _fit_encoding(comp.data, comp.id_col)
+    if encoding.is_identity:
+        return comp, encoding
+    encoded = Comparisons(
+        comparisons=encoding.encode(comp.comparisons, periods=["E", "E_h"]),
+        sgdd=encoding.encode(comp.sgdd, units=["C_SGDD"], periods=["E"]),
+        swdd=encoding.encode(comp.swdd, units=["C_SWDD"], periods=["E"]),
+        data=encoding.encode(comp.data),
+        id_col=comp.id_col,
+    )
+    return encoded, encoding
+
+
+def _validate(data: pl.DataFrame, id_col: str = "id") -> None:
+    """Raises if `data` is not a panel with absorbing staggered treatment."""
+    validate_panel(
+        data, unit=id_col, time="t", group="E", treatment="D"
+    ).raise_for_errors()
+
+
 def comparisons(
     data: pl.DataFrame,
     horizon: int = 7,
@@ -255,6 +297,10 @@ def comparisons(
     Compute SGDD and SWDD comparison groups for staggered treatment adoption
     analysis.
 
+    Non-integer unit ids and periods are dictionary-encoded to integer codes
+    for the computations and decoded in the returned tables (see
+    `did_sw.encoding`).
+
     Parameters:
     -----------
     data : pl.DataFrame
@@ -269,7 +315,20 @@ def comparisons(
     """
     if len(sdiff := REL_COLS - set(data.columns)) != 0:
         raise ValueError(f"Missing columns: {sdiff}")
+    _validate(data, id_col)
+    encoding = _fit_encoding(data, id_col)
+    comp = _comparisons(encoding.encode(data), horizon=horizon, id_col=id_col)
+    comp.data = data
+    comp.encoding = encoding
+    return _decode_comparisons(comp, encoding)
+
 
+def _comparisons(
+    data: pl.DataFrame,
+    horizon: int = 7,
+    id_col: str = "id",
+) -> Comparisons:
+    """`comparisons` on data with encoded keys."""
     base_comparison = (
         data.select("E")
         .unique()
@@ -306,7 +365,7 @@ def comparisons(
         .sort("E", "h")
     )
 
-    base_swdd = comparisons.pipe(_swdd_condition).filter("valid_swdd").sort("E", "h")
+    base_swdd = comparisons.pipe(_swdd_condition).filter("valid_swdd")
 
     swdd = (
         base_swdd.filter(pl.col("h").ge(0))
@@ -318,10 +377,33 @@ def comparisons(
         .sort("E", "h")
     )
 
-    return Comparisons(comparisons=comparisons, sgdd=sgdd, swdd=swdd, data=data)
+    return Comparisons(
+        comparisons=comparisons, sgdd=sgdd, swdd=swdd, data=data, id_col=id_col
+    )
+
+
+def _decode_outcomes(
+    c_outcomes: ComparisonsOutcomes,
+    encoding: KeyEncoding,
+) -> ComparisonsOutcomes:
+    if encoding.is_identity:
+        return c_outcomes
+    return ComparisonsOutcomes(
+        y_sgdd=encoding.decode(c_outcomes.y_sgdd, units=["id"], periods=["E"]),
+        y_swdd=encoding.decode(c_outcomes.y_swdd, units=["id"], periods=["E"]),
+        g_sgdd=encoding.decode(c_outcomes.g_sgdd, units=["ids"], periods=["E"]),
+        g_swdd=encoding.decode(c_outcomes.g_swdd, units=["ids"], periods=["E"]),
+    )
 
 
 def comparisons_outcomes(comp: Comparisons) -> ComparisonsOutcomes:
+    """Outcomes of the comparison groups; see `ComparisonsOutcomes`."""
+    encoded, encoding = _encode_comparisons(comp)
+    return _decode_outcomes(_comparisons_outcomes(encoded), encoding)
+
+
+def _comparisons_outcomes(comp: Comparisons) -> ComparisonsOutcomes:
+    """`comparisons_outcomes` on comparisons with encoded keys."""
     sgdd, swdd, comparisons = comp.sgdd, comp.swdd, comp.comparisons
 
     # Control groups and outcomes for period E_i + h and E_i - 1 for each
@@ -333,11 +415,13 @@ def comparisons_outcomes(comp: Comparisons) -> ComparisonsOutcomes:
             comparisons.select("E", "h", "Y", "Y_1", "id"),
             how="left",
             on=["E", "h", "id"],
+            maintain_order="left",
         )
         .with_columns(
             dY=pl.col("Y").sub(pl.col("Y_1")),
         )
-        .sort("E", "h")
+        # `sgdd` is sorted by (E, h)
+        .pipe(sort_by, "E", "h")
     )
     # Average over control groups
     g_sgdd = (
@@ -402,13 +486,38 @@ def comparisons_outcomes(comp: Comparisons) -> ComparisonsOutcomes:
     )
 
 
+def _decode_estimators(ests: Estimators, encoding: KeyEncoding) -> Estimators:
+    if encoding.is_identity:
+        return ests
+    return Estimators(
+        swdd=encoding.decode(ests.swdd, units=["id"], periods=["t", "E"]),
+        sgdd=encoding.decode(ests.sgdd, units=["id"], periods=["t", "E"]),
+    )
+
+
 def estimators(data: pl.DataFrame, c_outcomes: ComparisonsOutcomes):
+    encoding = _fit_encoding(data)
+    if encoding.is_identity:
+        return _estimators(data, c_outcomes)
+    c_outcomes = ComparisonsOutcomes(
+        y_sgdd=encoding.encode(c_outcomes.y_sgdd, units=["id"], periods=["E"]),
+        y_swdd=encoding.encode(c_outcomes.y_swdd, units=["id"], periods=["E"]),
+        g_sgdd=encoding.encode(c_outcomes.g_sgdd, units=["ids"], periods=["E"]),
+        g_swdd=encoding.encode(c_outcomes.g_swdd, units=["ids"], periods=["E"]),
+    )
+    return _decode_estimators(
+        _estimators(encoding.encode(data), c_outcomes), encoding
+    )
+
+
+def _estimators(data: pl.DataFrame, c_outcomes: ComparisonsOutcomes) -> Estimators:
+    """`estimators` on data and outcomes with encoded keys."""
     g_swdd, g_sgdd = c_outcomes.g_swdd, c_outcomes.g_sgdd
 
     outcomes = (
         data.select("id", "t", "E", "K", "Y")
         .rename({"K": "h"})
-        .sort("id", "t")
+        .pipe(sort_by, "id", "t")
         .join(
             # Merge outcome in t - 1 for each unit (if treated)
             data.filter(pl.col("K").eq(-1))
@@ -445,15 +554,24 @@ def compare_ests(ests: Estimators):
     )
 
 
+def _compare_estimators(df: pl.DataFrame) -> pl.DataFrame:
+    """`compare_estimators` on data with encoded keys."""
+    comps = _comparisons(df)
+    c_outcomes = _comparisons_outcomes(comps)
+    ests = _estimators(df, c_outcomes)
+    return compare_ests(ests)
+
+
 def compare_estimators(df: pl.DataFrame) -> pl.DataFrame:
     """
     Returns df with columns (id, E, h, swdd, sgdd)
     i.e. column with SWDD and SGDD estimates for each (id, E, h).
     """
-    comps = comparisons(df)
-    c_outcomes = comparisons_outcomes(comps)
-    ests = estimators(df, c_outcomes)
-    return compare_ests(ests)
+    _validate(df)
+    encoding = _fit_encoding(df)
+    return encoding.decode(
+        _compare_estimators(encoding.encode(df)), units=["id"], periods=["E"]
+    )
 
 
 @dataclass
@@ -464,19 +582,34 @@ class ComparisonResults:
     comparison: pl.DataFrame
 
 
-def full_comparison(df: pl.DataFrame) -> ComparisonResults:
+def full_comparison(
+    df: pl.DataFrame, disk_cache: str | Path | DiskCache | None = None
+) -> ComparisonResults:
     """
     Returns dataclass with all comparison results.
+
+    With `disk_cache` (a directory or `DiskCache`) the results are cached on
+    disk keyed by the fingerprint of `df`.
     """
-    comps = comparisons(df)
-    c_outcomes = comparisons_outcomes(comps)
-    ests = estimators(df, c_outcomes)
+    if disk_cache is not None:
+        return DiskCache.of(disk_cache).get_or_compute(
+            hash_key("full_comparison", fingerprint(df)),
+            lambda: full_comparison(df),
+        )
+    _validate(df)
+    encoding = _fit_encoding(df)
+    encoded = encoding.encode(df)
+    comps = _comparisons(encoded)
+    c_outcomes = _comparisons_outcomes(comps)
+    ests = _estimators(encoded, c_outcomes)
     ov = compare_ests(ests)
+    comps.data = df
+    comps.encoding = encoding
     return ComparisonResults(
-        comparisons=comps,
-        comparisons_outcomes=c_outcomes,
-        estimators=ests,
-        comparison=ov,
+        comparisons=_decode_comparisons(comps, encoding),
+        comparisons_outcomes=_decode_outcomes(c_outcomes, encoding),
+        estimators=_decode_estimators(ests, encoding),
+        comparison=encoding.decode(ov, units=["id"], periods=["E"]),
     )
 
 
@@ -575,19 +708,25 @@ def bootstrap(df: pl.DataFrame, B: int = 999, agg: AggOption = "dynamic"):
     Resample ids and compute the estimates
     """
     cols = get_cols(agg)
-    ids = df["id"].unique().to_numpy()
+    encoding = _fit_encoding(df)
+    encoded = encoding.encode(df)
+    ids = encoded["id"].unique().to_numpy()
 
     def _bstrap():
         b_ids = np.random.choice(ids, size=ids.size, replace=True)
         return (
-            compare_estimators(df.filter(pl.col("id").is_in(b_ids)))
+            _compare_estimators(encoded.filter(pl.col("id").is_in(b_ids)))
             .group_by(cols)
             .agg(pl.col("swdd", "sgdd").mean())
         )
 
-    return pl.concat(
-        _bstrap().with_columns(b=pl.lit(b))
-        for b in tqdm(range(B), desc="Bootstrapping ...")
+    return encoding.decode(
+        pl.concat(
+            _bstrap().with_columns(b=pl.lit(b))
+            for b in tqdm(range(B), desc="Bootstrapping ...")
+        ),
+        units=[],
+        periods=["E"],
     )
 
 
@@ -0,0 +1,196 @@
+"""
+Dictionary encoding of the unit and time keys of a panel.
+
+Units and periods are mapped to contiguous `Int32` codes once at entry such
+that all sorts, joins, windows and membership tests run on integer keys;
+labels are only decoded in the returned tables.
+
+- Units are encoded if they are not integers; the code of a unit is the
+  position of its label among the sorted labels, so sorting on codes equals
+  sorting on labels.
+- Periods are encoded if they are not integers (e.g. `Date`); the code of a
+  period is one plus its position among the sorted periods and cohorts, so
+  relative times K = t - E count periods. Never-treated units (null cohort)
+  get the cohort code `NEVER_TREATED`.
+"""
+
+from dataclasses import dataclass
+
+from typing import TypeVar
+
+import polars as pl
+
+
+__all__ = [
+    "NEVER_TREATED",
+    "KeyEncoding",
+]
+
+
+#  NOTE: never-treated value of `did_imp` and `comparison`
+NEVER_TREATED = -99
+CODE_DTYPE = pl.Int32
+
+Frame = TypeVar("Frame", pl.DataFrame, pl.LazyFrame)
+
+
+@dataclass(frozen=True)
+class KeyEncoding:
+    """Dictionaries of the unit and period labels of a panel.
+
+    Args:
+        unit: Unit column.
+        time: Time column.
+        group: Cohort column (encoded with the periods).
+        units: Sorted unit labels (None if units are not encoded).
+        periods: Sorted period labels (None if periods are not encoded).
+    """
+
+    unit: str
+    time: str
+    group: str | None = None
+    units: pl.Series | None = None
+    periods: pl.Series | None = None
+
+    @classmethod
+    def fit(
+        cls,
+        data: pl.DataFrame | pl.LazyFrame,
+        unit: str,
+        time: str,
+        group: str | None = None,
+    ) -> "KeyEncoding":
+        """Encoding of the non-integer keys of `data`.
+
+        Only the labels of the key columns of a `LazyFrame` are collected
+        (the units and periods together with `pl.collect_all`).
+        """
+        frame = data.lazy()
+        schema = frame.collect_schema()
+        queries = {}
+        if not schema[unit].is_integer():
+            queries["units"] = frame.select(pl.col(unit).unique().drop_nulls().sort())
+        if not schema[time].is_integer():
+            values = [frame.select(time)]
+            if group is not None:
+                cohorts = pl.col(group).cast(schema[time], strict=False).alias(time)
+                values.append(frame.select(cohorts))
+            queries["periods"] = pl.concat(values).select(
+                pl.col(time).unique().drop_nulls().sort()
+            )
+        labels = {}
+        if queries:
+            collected = pl.collect_all(list(queries.values()))
+            labels = {key: df.to_series() for key, df in zip(queries, collected)}
+        return cls(
+            unit=unit,
+            time=time,
+            group=group,
+            units=labels.get("units"),
+            periods=labels.get("periods"),
+        )
+
+    @property
+    def is_identity(self) -> bool:
+        """Whether no key is encoded."""
+        return self.units is None and self.periods is None
+
+    def _columns(
+        self,
+        units: list[str] | None,
+        periods: list[str] | None,
+    ) -> tuple[list[str], list[str]]:
+        if units is None:
+            units = [self.unit]
+        if periods is None:
+            periods = [col for col in [self.time, self.group] if col is not None]
+        return (
+            units if self.units is not None else [],
+            periods if self.periods is not None else [],
+        )
+
+    def encode(
+        self,
+        data: Frame,
+        units: list[str] | None = None,
+        periods: list[str] | None = None,
+    ) -> Frame:
+        """Replaces unit and period labels by their codes.
+
+        A `LazyFrame` stays lazy such that the encoding is part of its plan.
+
+        Args:
+            units: Unit columns (defaults to `unit`); list columns are
+                encoded elementwise.
+            periods: Period columns (defaults to `time` and `group`).
+        """
+        units, periods = self._columns(units, periods)
+        if not units and not periods:
+            return data
+        schema = data.collect_schema()
+        exprs = []
+        if units:
+            labels = self.units
+            codes = pl.int_range(labels.len(), dtype=CODE_DTYPE, eager=True)
+            exprs += [_replace(schema, col, labels, codes) for col in units]
+        if periods:
+            labels = self.periods
+            codes = pl.int_range(1, labels.len() + 1, dtype=CODE_DTYPE, eager=True)
+            exprs += [
+                _replace(
+                    schema,
+                    col,
+                    labels.cast(schema[col], strict=False),
+                    codes,
+                    default=NEVER_TREATED,
+                )
+                for col in periods
+            ]
+        return data.with_columns(exprs)
+
+    def decode(
+        self,
+        data: pl.DataFrame,
+        units: list[str] | None = None,
+        periods: list[str] | None = None,
+    ) -> pl.DataFrame:
+        """Replaces unit and period codes by their labels; see `encode`.
+
+        Columns of `units` and `periods` not in `data` are skipped.
+        """
+        units, periods = self._columns(units, periods)
+        units = [col for col in units if col in data.columns]
+        periods = [col for col in periods if col in data.columns]
+        if not units and not periods:
+            return data
+        exprs = []
+        if units:
+            codes = pl.int_range(self.units.len(), dtype=CODE_DTYPE, eager=True)
+            exprs += [_replace(data.schema, col, codes, self.units) for col in units]
+        if periods:
+            codes = pl.int_range(
+                1, self.periods.len() + 1, dtype=CODE_DTYPE, eager=True
+            )
+            exprs += [
+                # Never-treated cohorts are decoded as null
+                _replace(data.schema, col, codes, self.periods, default=pl.lit(None))
+                for col in periods
+            ]
+        return data.with_columns(exprs)
+
+
+def _replace(
+    schema: pl.Schema,
+    col: str,
+    old: pl.Series,
+    new: pl.Series,
+    default: int | pl.Expr | None = None,
+) -> pl.Expr:
+    """Hash lookup of `col` in `old`; values not in `old` are `default`."""
+    if isinstance(schema[col], pl.List):
+        expr = pl.col(col).list.eval(
+            pl.element().replace_strict(old, new, default=default)
+        )
+    else:
+        expr = pl.col(col).replace_strict(old, new, default=default)
+    return expr.alias(col)
@@ -6,21 +6,53 @@ See paper:
 - Appendix: https://web.econ.ku.dk/nharmon/docs/harmon2024onlineappendix.pdf
 """
 
-from functools import reduce
+import os
+import tempfile
+import weakref
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
 
 import polars as pl
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 from pyfixest.estimation.feols_ import Feols
-from typing import Literal
+from typing import Any, Literal
 
 import did_imp
 
+from did_sw import closed_form, fixed_effects
+from did_sw.cache import (
+    DiskCache,
+    LRUCache,
+    default_cache,
+    file_fingerprint,
+    fingerprint,
+    hash_key,
+)
+from did_sw.encoding import KeyEncoding
+from did_sw.prep import (
+    Precision,
+    cached_prep_data,
+    constant_columns,
+    float_dtype,
+    formula_columns,
+    prep_data,
+    required_columns,
+    unique,
+)
+
 
 __all__ = [
     "DidSwResult",
     "estimate",
+    "estimate_from_parquet",
+    "compress_units",
     "assign_weights_horizon",
     "assign_weights_agg",
+    "assign_weights_sparse",
+    "sparse_weights_from_columns",
+    "aggregate_sparse",
     "rename_horizons",
 ]
 
@@ -38,61 +70,566 @@ def assign_weights_horizon(
     min_K: int = 0,
     k_vals: list[int] | None = None,
     prefix: str = "horizon",
+    precision: Precision = "float64",
 ):
     """
+    Assigns the weights `{prefix}{h}` for each horizon h.
+
+    The weight of a row for horizon h is `iwtr / iwtr_s` if 0 <= K <= h and
+    maxK >= h and zero otherwise, where `iwtr_s` is the sum of `iwtr` over all
+    rows with K == h. The per-horizon sums are computed in one grouped pass
+    over `K` and all horizon columns are then added in a single
+    `with_columns`.
+
     Args:
         min_K: Minimum horizon to consider.
+        precision: Dtype of the weight columns; the sums of `iwtr` are
+            computed in float64 either way.
     """
+    dtype = float_dtype(precision)
+    if not k_vals:
+        k_max = df["K"].max()
+        if not isinstance(k_max, int):
+            raise ValueError("Column 'K' has no non-null values.")
+        maxmaxK = int(k_max)
+        k_vals = list(range(min_K, maxmaxK + 1))
+    if not k_vals:
+        return df
 
-    def _assign_horizon(df: pl.DataFrame, h: int):
-        #  TODO: custom iwtr should be passed by user
-        return df.with_columns(
-            # Sum of weights for K == h
-            iwtr_s=pl.col("iwtr").filter(pl.col("K").eq(h)).sum()
-        ).with_columns(
-            # Compute weights for each horizon;
-            # 0 <= K <= x; maxK >= x;
+    totals = _horizon_totals(df, k_vals)
+    iwtr_s = {
+        h: pl.lit(s, dtype=totals.schema["iwtr_s"])
+        for h, s in zip(totals["h"].to_list(), totals["iwtr_s"].to_list())
+    }
+    return df.with_columns(
+        # Sum of weights for K == h for the last horizon
+        iwtr_s=iwtr_s[k_vals[-1]],
+    ).with_columns(
+        # Compute weights for each horizon;
+        # 0 <= K <= x; maxK >= x;
+        *(
             pl.col("K")
             .is_between(0, h, closed="both")
             .and_(pl.col("maxK").ge(h))
-            .mul(pl.col("iwtr").truediv(pl.col("iwtr_s")))
-            .over(id_col)
+            .mul(pl.col("iwtr").truediv(iwtr_s[h]))
+            .cast(dtype)
             .alias(f"{prefix}{h}")
+            for h in k_vals
         )
+    )
 
-    if not k_vals:
-        k_max = df["K"].max()
-        if not isinstance(k_max, int):
-            raise ValueError("Column 'K' has no non-null values.")
-        maxmaxK = int(k_max)
-        k_vals = list(range(min_K, maxmaxK + 1))
-    return reduce(_assign_horizon, k_vals, df)
+
+def _horizon_totals(df: pl.DataFrame, k_vals: list[int]) -> pl.DataFrame:
+    """Sum of `iwtr` for K == h for each h in `k_vals`.
+
+    Returns a frame with columns (h, iwtr_s) with a row for each h in `k_vals`.
+    """
+    totals = (
+        df.lazy()
+        .filter(pl.col("K").is_in(k_vals))
+        .group_by("K")
+        .agg(pl.col("iwtr").sum().alias("iwtr_s"))
+        .collect()
+    )
+    dtype = totals.schema["iwtr_s"]
+    sums = dict(zip(totals["K"].to_list(), totals["iwtr_s"].to_list()))
+    # Horizons without any rows have a sum of zero
+    return pl.DataFrame(
+        {"h": k_vals, "iwtr_s": [sums.get(h, 0) for h in k_vals]},
+        schema={"h": pl.Int64, "iwtr_s": dtype},
+    )
 
 
 def assign_weights_agg(
     df: pl.DataFrame,
     id_col: str = "id",
+    precision: Precision = "float64",
 ):
     """Assigns weights used to compute the aggregate effect.
 
     Computes weights for aggregate effect for the SWDD estimator using
-    Borusyaks imputation estimator.
+    Borusyaks imputation estimator. The weight of a treated row is
+    `iwtr * (maxK - K + 1)` over the sum of `iwtr` of all treated rows.
+
+    Args:
+        precision: Dtype of `a2w` and `average`; see `assign_weights_horizon`.
     """
+    dtype = float_dtype(precision)
     return df.with_columns(
-        a2w=pl.col("maxK").sub("K").add(1).mul(pl.col("K").ge(0)).over(id_col),
+        a2w=pl.col("maxK")
+        .sub("K")
+        .add(1)
+        .mul(pl.col("K").ge(0))
+        .mul(pl.col("iwtr"))
+        .over(id_col),
         iwtr_s=pl.col("iwtr").filter(pl.col("K").ge(0)).sum(),
     ).with_columns(
-        average=(pl.col("a2w") / pl.col("iwtr_s")),
+        average=(pl.col("a2w") / pl.col("iwtr_s")).cast(dtype),
+        a2w=pl.col("a2w").cast(dtype),
+    )
+
+
+def assign_weights_sparse(
+    df: pl.DataFrame,
+    min_K: int = 0,
+    k_vals: list[int] | None = None,
+    prefix: str = "horizon",
+    average: bool = False,
+    precision: Precision = "float64",
+) -> pl.DataFrame:
+    """Sparse long-format version of the horizon and aggregate weights.
+
+    Returns the non-zero entries of the weights of `assign_weights_horizon`
+    (and `assign_weights_agg` if `average=True`) as a (row, term, weight)
+    triplet table, where `row` is the row index in `df` and `term` the name
+    of the dense weight column. The table is sorted by term and row.
+
+    A row only carries weight for horizons K <= h <= maxK, so the table has
+    O(nonzeros) instead of O(rows x horizons) entries.
+
+    Args:
+        min_K: Minimum horizon to consider.
+        average: Whether to include the weights of the aggregate effect.
+        precision: Dtype of the weights; see `assign_weights_horizon`.
+    """
+    if not k_vals:
+        k_max = df["K"].max()
+        if not isinstance(k_max, int):
+            raise ValueError("Column 'K' has no non-null values.")
+        k_vals = list(range(min_K, int(k_max) + 1))
+    return _sparse_weights_with_totals(
+        df,
+        k_vals,
+        totals=_horizon_totals(df, k_vals),
+        treated_total=df["iwtr"].filter(df["K"].ge(0)).sum() if average else None,
+        prefix=prefix,
+        precision=precision,
     )
 
 
+def _sparse_weights_with_totals(
+    df: pl.DataFrame,
+    k_vals: list[int],
+    totals: pl.DataFrame,
+    treated_total: float | None = None,
+    prefix: str = "horizon",
+    precision: Precision = "float64",
+) -> pl.DataFrame:
+    """`assign_weights_sparse` with given normalizing sums of `iwtr`.
+
+    Args:
+        totals: Output of `_horizon_totals` i.e. the sums of `iwtr` for
+            K == h for each h in `k_vals`.
+        treated_total: Sum of `iwtr` over treated rows; the weights of the
+            aggregate effect are added if given.
+    """
+    dtype = float_dtype(precision)
+    rows = df.lazy().select(
+        pl.int_range(pl.len(), dtype=pl.UInt32).alias("row"),
+        "K",
+        "maxK",
+        "iwtr",
+    )
+    horizons = (
+        rows.filter(pl.col("K").ge(0))
+        .with_columns(h=pl.int_ranges("K", pl.col("maxK").add(1)))
+        .explode("h")
+        .join(totals.with_row_index("order").lazy(), on="h", how="inner")
+        .select(
+            "row",
+            pl.format("{}{}", pl.lit(prefix), "h").alias("term"),
+            weight=pl.col("iwtr").truediv(pl.col("iwtr_s")),
+            order=pl.col("order"),
+        )
+    )
+    frames = [horizons]
+    if treated_total is not None:
+        frames.append(
+            rows.filter(pl.col("K").ge(0)).select(
+                "row",
+                term=pl.lit("average"),
+                weight=pl.col("maxK")
+                .sub("K")
+                .add(1)
+                .mul(pl.col("iwtr"))
+                .truediv(pl.lit(treated_total, dtype=pl.Float64)),
+                order=pl.lit(len(k_vals), dtype=pl.UInt32),
+            )
+        )
+    return (
+        pl.concat(frames)
+        .sort("order", "row")
+        .select("row", "term", pl.col("weight").cast(dtype))
+        .collect()
+    )
+
+
+def sparse_weights_from_columns(
+    df: pl.DataFrame,
+    weights: list[str],
+    precision: Precision = "float64",
+) -> pl.DataFrame:
+    """(row, term, weight) triplets of the non-zero entries of weight columns."""
+    return (
+        df.select(weights)
+        .with_row_index("row")
+        .unpivot(index="row", variable_name="term", value_name="weight")
+        .filter(pl.col("weight").ne(0))
+        .cast({"weight": float_dtype(precision)})
+    )
+
+
+def aggregate_sparse(
+    tes: pl.DataFrame,
+    weights: pl.DataFrame,
+    effect: str = "Yadj",
+) -> pl.DataFrame:
+    """Weighted aggregation of imputed treatment effects with sparse weights.
+
+    Args:
+        tes: Data with a `row` index column and the imputed treatment effects.
+        weights: (row, term, weight) triplet table.
+        effect: Column of `tes` with the imputed treatment effects.
+
+    Returns:
+        DataFrame with columns (term, estimate).
+    """
+    return (
+        weights.join(tes.select("row", effect), on="row", how="left")
+        .group_by("term", maintain_order=True)
+        # Accumulated in float64 also for float32 weights and effects
+        .agg(
+            estimate=pl.col("weight")
+            .cast(pl.Float64)
+            .mul(pl.col(effect).cast(pl.Float64))
+            .sum()
+        )
+    )
+
+
+RetainPolicy = Literal["full", "spill", "influence", "estimates"]
+
+
+class _SpillFile:
+    """Spilled data file, removed once no result refers to it anymore.
+
+    Copies of a result (e.g. by `dataclasses.replace`) share the handle, so
+    the file outlives the result that spilled it as long as a copy is alive.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        weakref.finalize(self, path.unlink, missing_ok=True)
+
+
 @dataclass
 class DidSwResult:
     estimates: pl.DataFrame
     N: int
-    data: pl.DataFrame
+    data: pl.DataFrame | None
     names: list[str]
-    mod: Feols
+    mod: Feols | None
+    weights: pl.DataFrame | None = None
+    influence: pl.DataFrame | None = None
+    data_path: Path | None = None
+    params: did_imp.DidImpParams | None = None
+    encoding: KeyEncoding | None = None
+    groups: dict[tuple, "DidSwResult"] | None = None
+    # Whether the imputation equals the period means of the closed form
+    closed_form_imputation: bool = False
+    _spill: _SpillFile | None = field(default=None, repr=False, compare=False)
+
+    def retain(
+        self,
+        policy: "RetainPolicy",
+        spill_dir: str | Path | None = None,
+    ) -> "DidSwResult":
+        """Copy of the result only keeping what `policy` asks for.
+
+        Args:
+            policy: One of:
+                - "full": Keep everything in memory.
+                - "spill": Keep everything, but spill `data` to an
+                    uncompressed Arrow IPC file in `spill_dir` (default: the
+                    temporary directory), which is memory-mapped such that
+                    the data is only read from disk when it is accessed.
+                    The file is removed when the result and all copies
+                    of it are garbage collected.
+                - "influence": Keep the estimates and the influence
+                    contributions (sparse path only; see `estimate`).
+                - "estimates": Keep only the estimates.
+        """
+        match policy:
+            case "full":
+                return self
+            case "spill":
+                if self.data is None or self.data_path is not None:
+                    return self
+                fd, path = tempfile.mkstemp(
+                    suffix=".arrow", prefix="did_sw_", dir=spill_dir
+                )
+                os.close(fd)
+                self.data.write_ipc(path, compression="uncompressed")
+                spill = _SpillFile(Path(path))
+                return replace(
+                    self,
+                    # Uncompressed IPC files are memory-mapped by `read_ipc`
+                    data=pl.read_ipc(path),
+                    data_path=spill.path,
+                    _spill=spill,
+                )
+            case "influence":
+                return replace(self, data=None, mod=None, weights=None)
+            case "estimates":
+                return replace(self, data=None, mod=None, weights=None, influence=None)
+            case _:
+                raise ValueError(f"Invalid retain policy: {policy!r}")
+
+    def decode(
+        self,
+        encoding: KeyEncoding,
+        cluster: str,
+        retain: "RetainPolicy" = "full",
+        spill_dir: str | Path | None = None,
+    ) -> "DidSwResult":
+        """Applies the retention policy and decodes the keys of the kept tables.
+
+        Args:
+            encoding: Key encoding of the prepared data (see `prep.prep_data`).
+            cluster: Cluster column of the influence contributions; these are
+                only decoded if clustered by the unit.
+            retain: Retention policy; see `retain`.
+            spill_dir: Directory of a spilled data file; see `retain`.
+        """
+        res = replace(self, encoding=encoding)
+        if retain in ("influence", "estimates"):
+            res = res.retain(retain)
+        if not encoding.is_identity:
+            periods = [
+                encoding.time,
+                "tlag",
+                *([encoding.group] if encoding.group else []),
+            ]
+            res = replace(
+                res,
+                data=None
+                if res.data is None
+                else encoding.decode(res.data, periods=periods),
+                influence=res.influence
+                if res.influence is None or cluster != encoding.unit
+                else encoding.decode(res.influence, periods=[]),
+            )
+        return res.retain(retain, spill_dir=spill_dir)
+
+    def _psi(self) -> pl.DataFrame:
+        """Influence contributions with the terms named as in `estimates`."""
+        if self.influence is None:
+            raise ValueError(
+                "The result has no influence contributions; estimate with "
+                "`sparse=True` or `engine='closed_form'` and a retain policy "
+                "keeping them."
+            )
+        # Horizon terms of the estimates have the "horizon" prefix stripped
+        return self.influence.with_columns(
+            pl.col("term").str.replace("^horizon", "")
+        )
+
+    def influence_matrix(self) -> pl.DataFrame:
+        """Influence contributions with a row per cluster and a column per term.
+
+        The standard error of a term is the square root of the sum of its
+        squared column and the standard error of a linear combination of the
+        terms that of the same combination of the columns; see `lincom`.
+        """
+        psi = self._psi()
+        cluster = next(col for col in psi.columns if col not in ("term", "psi"))
+        terms = [
+            term for term in self.estimates["term"] if term in set(psi["term"])
+        ]
+        return (
+            psi.pivot(on="term", index=cluster, values="psi")
+            .select(cluster, *terms)
+            .fill_null(0)
+            .sort(cluster)
+        )
+
+    def lincom(
+        self,
+        weights: dict[str, float],
+        name: str = "lincom",
+        alpha: float = 0.05,
+    ) -> pl.DataFrame:
+        """Estimate and inference of a linear combination of the terms.
+
+        The estimate is the weighted sum of the estimates of the terms and its
+        standard error is computed from the same weighted sum of the influence
+        contributions, so no refit is needed.
+
+        Args:
+            weights: Weights of the terms as named in `estimates`, e.g.
+                `{"0": 0.5, "1": 0.5}` for the average over horizons 0 and 1
+                or `{"1": 1, "0": -1}` for their difference.
+            name: Term of the returned row.
+            alpha: Significance level of the confidence interval.
+
+        Returns:
+            DataFrame with a single row and the columns of
+            `closed_form.inference`.
+        """
+        psi = self._psi()
+        if missing := set(weights) - set(self.estimates["term"]):
+            raise ValueError(f"Unknown terms: {sorted(missing)}")
+        w = pl.DataFrame(
+            {"term": list(weights), "w": list(weights.values())},
+            schema={"term": pl.String, "w": pl.Float64},
+        )
+        cluster = next(col for col in psi.columns if col not in ("term", "psi"))
+        estimate = self.estimates.join(w, on="term", how="inner").select(
+            term=pl.lit(name), estimate=pl.col("estimate").mul("w").sum()
+        )
+        combined = (
+            psi.join(w, on="term", how="inner")
+            .group_by(cluster)
+            .agg(psi=pl.col("psi").mul("w").sum())
+            .select(pl.lit(name).alias("term"), cluster, "psi")
+        )
+        return closed_form.inference(estimate, combined, alpha=alpha)
+
+    def recluster(
+        self,
+        cluster_var: str,
+        clusters: pl.DataFrame | None = None,
+        alpha: float = 0.05,
+    ) -> "DidSwResult":
+        """Result with the standard errors clustered by `cluster_var`.
+
+        The imputed effects are recomputed from `data` with the period means
+        of the closed form and the influence contributions of the stored
+        `weights` are summed within the new clusters; the point estimates
+        are unchanged and nothing is refit. Bootstrap columns of the
+        estimates are dropped. If the units were compressed with
+        `compress=True`, the new clusters must nest the estimation clusters.
+        Only for results with time fixed effects only and no covariates.
+
+        Args:
+            cluster_var: Cluster column of `data` (see `clusters` of
+                `estimate`) or of `clusters`.
+            clusters: Optional table of units and their clusters, i.e. with
+                the columns (unit, `cluster_var`), for clusters that were
+                not used in the estimation.
+            alpha: Significance level of the confidence intervals.
+        """
+        if self.influence is None or self.data is None or self.weights is None:
+            raise ValueError(
+                "Reclustering requires a result of the sparse path keeping "
+                "`data`, `weights` and `influence`."
+            )
+        if not self.closed_form_imputation:
+            raise ValueError(
+                "Reclustering imputes in closed form and requires a result "
+                "with time fixed effects only; refit with the new `cluster_var` "
+                "(with `cache=` the imputation is reused)."
+            )
+        params = self.params
+        encoding = self.encoding or KeyEncoding(
+            unit=params.unit, time=params.time, group=params.group
+        )
+        data = self.data
+        if clusters is not None:
+            data = data.join(
+                clusters.select(params.unit, cluster_var).unique(params.unit),
+                on=params.unit,
+                how="left",
+                maintain_order="left",
+            )
+        if cluster_var not in data.columns:
+            raise ValueError(
+                f"Cluster column `{cluster_var}` not in data; keep it with "
+                f"`estimate(..., clusters={cluster_var!r})` or pass a table of "
+                "the clusters of the units as `clusters=`."
+            )
+        if data[cluster_var].null_count():
+            raise ValueError(f"Units without a cluster in `{cluster_var}`.")
+
+        lagged = "tlag" in data.columns
+        data = encoding.encode(
+            data,
+            periods=[params.time, params.group, *(["tlag"] if lagged else [])],
+        ).with_row_index("row")
+        tes = closed_form.impute_effects(data, time=params.time, outcome=params.outcome)
+        pretrend = pl.col("term").str.starts_with("pretrend")
+        psi = closed_form.influence(
+            tes,
+            self.weights.filter(pretrend.not_()),
+            time=params.time,
+            group=params.group,
+            cluster=cluster_var,
+        )
+        leads = [
+            int(term.removeprefix("pretrend"))
+            for term in self.weights.filter(pretrend)["term"].unique().to_list()
+        ]
+        if leads:
+            _, _, pre_psi = _estimate_pretrends(
+                data, params, cluster_var, sorted(leads)
+            )
+            psi = pl.concat([psi, pre_psi])
+        if cluster_var == params.unit:
+            psi = encoding.decode(psi, periods=[])
+        estimates = closed_form.inference(
+            self.estimates.select("term", "estimate"),
+            psi.with_columns(pl.col("term").str.replace("^horizon", "")),
+            alpha=alpha,
+        )
+        return replace(self, estimates=estimates, influence=psi)
+
+    def jackknife(self, by: str | None = None) -> pl.DataFrame:
+        """Estimates leaving out each group of `by` in turn.
+
+        The leave-out estimates of the horizons and the aggregate effect are
+        computed from group-level sums of the closed form by subtracting the
+        sums of each group from the totals (see
+        `closed_form.leave_out_estimates`), in O(groups) instead of a fit
+        per group. Pretrends and custom weights are not included.
+
+        Args:
+            by: Column of `data` constant within units, e.g. a cluster
+                column (defaults to the cohort i.e. leave-one-cohort-out).
+
+        Returns:
+            DataFrame with columns (by, term, estimate) in the order of the
+            groups and the terms of `estimates`.
+        """
+        if self.data is None or self.params is None:
+            raise ValueError(
+                "The jackknife requires a result of `engine='closed_form'` "
+                "keeping `data`."
+            )
+        if not self.closed_form_imputation:
+            raise ValueError(
+                "The jackknife imputes in closed form and requires a result "
+                "with time fixed effects only."
+            )
+        params = self.params
+        by = by or params.group
+        if by not in self.data.columns:
+            raise ValueError(f"Column `{by}` not in data.")
+        terms = self.estimates["term"].to_list()
+        horizons = [int(term) for term in terms if term.isdigit()]
+        leave_out = closed_form.leave_out_estimates(
+            self.data,
+            time=params.time,
+            by=by,
+            horizons=horizons,
+            average="average" in terms,
+            outcome=params.outcome,
+        )
+        order = pl.DataFrame({"term": terms}).with_row_index("order")
+        return (
+            leave_out.join(order, on="term", how="inner")
+            .sort(by, "order", nulls_last=True)
+            .drop("order")
+        )
 
     def __repr__(self):
         return repr(self.estimates)
@@ -108,8 +645,124 @@ class DidSwResult:
         )
 
 
-def estimate(
+def compress_units(
     data: pl.DataFrame,
+    group: str,
+    time: str,
+    unit: str,
+    cluster: str | list[str],
+    outcome: str = "dY",
+) -> pl.DataFrame:
+    """Collapses units into frequency-weighted units.
+
+    Units with the same cohort, observed periods and cluster(s) are collapsed into
+    a single unit (identified by the smallest unit id) with `iwtr` equal to
+    the sum of their weights and `outcome` equal to their weighted mean in
+    each period. The closed-form estimates and clustered standard errors are
+    the same on the collapsed data, since both are linear in the weighted
+    outcomes within a cluster.
+
+    Args:
+        data: Prepared data with columns K, D, iwtr, dY and maxK (and
+            optionally tlag, in which case the first period of the units is
+            part of the pattern).
+    """
+    lagged = "tlag" in data.columns
+    clusters = [cluster] if isinstance(cluster, str) else cluster
+    cell = unique([group, "_pattern", *(["_first"] if lagged else []), *clusters])
+    patterns = data.group_by(unit).agg(
+        pl.col(time).sort().alias("_pattern"),
+        *([pl.col("tlag").min().alias("_first")] if lagged else []),
+    )
+    return (
+        data.join(patterns, on=unit, how="left")
+        .with_columns(pl.col(unit).min().over(cell))
+        .group_by(unique([*cell, unit, time]))
+        .agg(
+            pl.col(outcome)
+            .mul("iwtr")
+            .sum()
+            .truediv(pl.col("iwtr").sum())
+            .cast(data.schema[outcome]),
+            pl.col("iwtr").sum(),
+            pl.col("K", "D", "maxK", *(["tlag"] if lagged else [])).first(),
+        )
+        .drop("_pattern", *(["_first"] if lagged else []))
+        .sort(unit, time)
+    )
+
+
+def _horizon_terms(
+    data: pl.DataFrame,
+    horizons: Literal["static", "event", "all"] | list[int] | None,
+    weights: list[str],
+    sparse: bool = False,
+) -> tuple[list[int] | None, list[str], bool]:
+    """Horizons and terms of `horizons`; see `estimate`.
+
+    Returns:
+        The horizons `k_vals` (None if no horizon weights are assigned), the
+        names of the terms and whether the aggregate weights are assigned.
+    """
+    match horizons:
+        case None | []:
+            if len(weights) == 0:
+                raise ValueError(
+                    "`horizons=None` provided but also no weights are specified. "
+                    "At least one horizon or weight must be provided."
+                )
+            return None, list(weights), False
+        case "event" | "all":
+            k_max = data["K"].max()
+            if not isinstance(k_max, int):
+                raise ValueError("Column 'K' has no non-null values.")
+            k_vals = list(range(int(k_max) + 1))
+            terms = [f"horizon{h}" for h in k_vals]
+            if horizons == "all":
+                return k_vals, [*terms, "average"], True
+            return k_vals, terms, False
+        case list() if all(isinstance(x, int) for x in horizons):
+            return horizons, [f"horizon{h}" for h in horizons], False
+        case "static" if sparse:
+            raise ValueError("`horizons='static'` is not supported with `sparse`.")
+        case "static":
+            return None, [*weights, "treat"], True
+        case _:
+            raise ValueError(
+                f"Invalid type for horizons:\n{type(horizons)=}\n{horizons=}"
+            )
+
+
+def _assign_weights(
+    data: pl.DataFrame,
+    horizons: Literal["static", "event", "all"] | list[int] | None,
+    unit: str,
+    weights: list[str],
+    precision: Precision = "float64",
+) -> tuple[pl.DataFrame, list[str]]:
+    """Assigns the dense weights of `horizons`; see `estimate`.
+
+    Returns:
+        The data with the weight columns and the names of the weights.
+    """
+    k_vals, terms, average = _horizon_terms(data, horizons, weights)
+    if k_vals:
+        data = data.pipe(
+            assign_weights_horizon, id_col=unit, k_vals=k_vals, precision=precision
+        )
+    if average:
+        data = data.pipe(assign_weights_agg, id_col=unit, precision=precision)
+    return data, terms
+
+
+def _cached(cache: LRUCache | None, key: tuple | None, fn: Callable[[], Any]) -> Any:
+    if cache is None or key is None:
+        return fn()
+    return cache.get_or_compute(key, fn)
+
+
+def estimate(
+    data: pl.DataFrame | pl.LazyFrame,
     outcome: str,
     group: str,
     time: str,
@@ -119,9 +772,25 @@ def estimate(
     covariates: list[str] | None = None,
     weights: list[str] | None = None,
     horizons: Literal["static", "event", "all"] | list[int] | None = "event",
-    pretrends: bool | list[int] | None = None,
+    pretrends: bool | int | list[int] | None = None,
     aweight: str | None = None,
     prep: bool = True,
+    sparse: bool = False,
+    streaming: bool = False,
+    engine: Literal["regression", "closed_form"] = "regression",
+    cache: bool | LRUCache = False,
+    retain: RetainPolicy = "full",
+    spill_dir: str | Path | None = None,
+    compress: bool = False,
+    precision: Precision = "float64",
+    parallel: Literal["cohort"] | None = None,
+    n_jobs: int | None = None,
+    bootstrap: int | None = None,
+    multipliers: closed_form.Multipliers = "rademacher",
+    seed: int | None = None,
+    by: str | list[str] | None = None,
+    disk_cache: str | Path | DiskCache | None = None,
+    clusters: str | list[str] | None = None,
 ) -> DidSwResult:
     """
     Estimate treatment effects using the Stepwise Difference-in-Differences (SWDD)
@@ -132,7 +801,10 @@ def estimate(
     imputation-based regression approach.
 
     Args:
-        data: A `polars.DataFrame` containing the panel dataset.
+        data: A `polars.DataFrame` or `polars.LazyFrame` containing the panel
+            dataset. With `prep=True` only the columns used for estimation
+            (outcome, group, time, unit, cluster, fixed effects, covariates and
+            weights) are read, sorted and collected once.
         outcome: Name of the outcome variable.
         group: Name of the treatment group variable.
         time: Name of the time variable.
@@ -148,30 +820,171 @@ def estimate(
                         post-treatment horizons.
             - "all": Include both event-study and static weights.
             - None: Use weights provided via `weights`.
-        pretrends: If True or list[int], reserve certain leads as pretrends
-            (currently not implemented).
-        aweight: Optional analytic weights variable (currently not implemented).
+        pretrends: Pretrend leads to estimate alongside the horizons; terms
+            are named `pretrend{l}` for lead l >= 2 (lead 1, the last period
+            before treatment, is the reference). One of:
+            - True: All leads available in the data.
+            - int: Leads 2, ..., `pretrends` + 1.
+            - list[int]: Custom list of leads.
+            Only for `fes=time` without covariates; the pretrends are
+            imputed in closed form from the reversed first differences of the
+            untreated rows and require `prep=True`. Their weights and
+            influence contributions are added to the result if the engine
+            keeps these.
+        aweight: Optional unit weights variable; must be constant within units.
+            Both the imputation and the horizon weights are weighted. With
+            `engine="regression"` the fit runs on the sparse path (see
+            `sparse`), where the imputation regression is fit by weighted
+            least squares with `fixed_effects.impute`, since `did_imp` does
+            not take regression weights; `horizons="static"` is not
+            supported there.
         prep: Whether to internally preprocess the data (e.g., compute `K`, `dY`, etc).
+        sparse: Whether to keep the weights as a sparse (row, term, weight)
+            triplet table instead of dense weight columns. The treatment
+            effects are imputed with `did_imp.compute_tes` and aggregated with
+            the sparse weights. The clustered standard errors are computed
+            from the imputed effects and the projection of the weights on the
+            fixed effects and covariates (see `did_sw.fixed_effects`).
+            `horizons="static"` is not supported.
+        streaming: Whether to collect a `LazyFrame` input with the streaming
+            engine of polars. The scan, filters, projection of the used
+            columns, key encoding, sort and differencing run in the streaming
+            engine; the projected panel is collected and estimated in memory,
+            so it must fit in memory (this is not an out-of-core estimator).
+        engine: How to impute the treatment effects. One of:
+            - "regression": Fit the imputation regression with
+                `did_imp.estimate` (default).
+            - "closed_form": Impute with period means of the untreated
+                observations; only for `fes=time` without covariates. The
+                weights are kept sparse as with `sparse=True` and the
+                clustered standard errors are computed analytically
+                (clustered by `unit` if `cluster_var` is None).
+        cache: Whether to cache the preprocessing and weights of a
+            `DataFrame` input in memory, keyed by a fingerprint of `data` and
+            the column arguments; repeated calls on the same data with e.g.
+            different clusters or fixed effects reuse the cached stages. A
+            cached regression runs on the sparse path as with `sparse=True`
+            (unless `horizons="static"`), where the fixed effects imputation
+            (keyed on the sample, `fes` and `covariates`) and the projection
+            of the weights for the standard errors are cached as well, such
+            that a sweep over clusters, weights or horizons demeans only
+            once. Pass an `LRUCache` to use a specific cache instead of
+            `did_sw.cache.default_cache`.
+        retain: What the result keeps; one of "full" (default), "spill"
+            (full, with `data` spilled to a memory-mapped Arrow IPC file),
+            "influence" (estimates and influence contributions) or
+            "estimates". See `DidSwResult.retain`.
+        spill_dir: Directory of the spilled data for `retain="spill"`.
+        compress: Whether to collapse units with the same cohort, observed
+            periods and cluster into frequency-weighted units before
+            estimation (see `compress_units`); only with
+            `engine="closed_form"`. Estimates and standard errors are
+            unchanged, `data` holds the collapsed panel.
+        precision: Dtype of the differenced outcome `dY` and the weights;
+            "float32" halves their memory, while all sums are accumulated
+            in float64. The float32 estimates and standard errors agree with
+            those of "float64" up to a relative error of about 1e-6 (checked
+            to `rtol=1e-5` on the Harmon simulation in the tests).
+        parallel: With "cohort", the weights, point estimates and influence
+            contributions are computed per treatment cohort in a thread pool
+            and summed; the period means of the untreated rows are computed
+            once. The estimates and standard errors equal those of the serial
+            path. Only with `engine="closed_form"`, since the imputation
+            regression pools the untreated rows of all cohorts.
+        n_jobs: Number of worker threads of `parallel` (defaults to the
+            default of `ThreadPoolExecutor`).
+        bootstrap: Number of draws of a multiplier (wild cluster) bootstrap
+            on the influence contributions; adds the bootstrap standard
+            errors `se_boot` and a uniform sup-t band (`lower_band`,
+            `upper_band`) over the horizons to the estimates (see
+            `closed_form.bootstrap`). Only on the sparse path (see `mod`
+            below), which keeps the influence contributions.
+        multipliers: Distribution of the bootstrap multipliers;
+            "rademacher" or "mammen".
+        seed: Seed of the bootstrap.
+        by: Column(s) of subgroups to estimate separately; must be constant
+            within units. The panel is prepared once and the groups are
+            estimated concurrently in a thread pool of `n_jobs` workers. The
+            returned estimates are stacked with the `by` columns first and
+            the result of each group is kept in `DidSwResult.groups`.
+        disk_cache: Directory (or `DiskCache`) of a persistent cache of the
+            results, keyed by a fingerprint of the row hashes of the used
+            columns of `data` and all other arguments; a `LazyFrame` is
+            collected to compute the fingerprint. The cache can be shared by
+            concurrent processes and survives restarts; cached results do
+            not keep the fitted `mod`. A `bootstrap` without a `seed` is not
+            cached, since its draws differ between calls.
+        clusters: Column(s) of alternative clusters to keep in `data` for
+            `DidSwResult.recluster`; the preprocessing drops all other
+            columns that are not used in the estimation. With `compress`,
+            units are only collapsed within these clusters as well.
 
     Returns:
         A `DidSwResult` object containing:
             - estimates: DataFrame of coefficient estimates.
             - N: Number of observations used.
-            - data: The processed dataset used in estimation.
+            - data: The processed dataset used in estimation (only the columns
+                used for estimation if `prep=True`).
             - names: List of variable names used.
-            - mod: The underlying `Feols` model object.
+            - mod: The underlying `Feols` model object (None on the sparse
+                path i.e. with `sparse`, `engine="closed_form"`, `cache` or
+                `aweight`).
+            - weights: The sparse weights (only on the sparse path).
+            - influence: Per-cluster influence contributions of each term
+                (only on the sparse path).
+            - data_path: Path of the spilled data (only if `retain="spill"`).
 
-    TODO:
-        - throw error if cont covariates varies across time
-            - must be time invariant!
-            - weights have to be constant across time within units
-        - pretrends
     """
-    if aweight:
-        raise NotImplementedError("TODO: aweight")
-    if pretrends:
-        raise NotImplementedError("TODO: fix pretrends")
+    if disk_cache is not None:
+        return _disk_cached(dict(locals()))
+    if engine == "closed_form" and not closed_form.is_closed_form(
+        time, fes, covariates
+    ):
+        raise ValueError(
+            "`engine='closed_form'` requires time fixed effects only i.e. "
+            f"`fes={time!r}` and no covariates."
+        )
+    if aweight and engine == "regression" and horizons == "static":
+        raise ValueError(
+            "`aweight` with `engine='regression'` does not support "
+            "`horizons='static'`."
+        )
+    if compress and engine != "closed_form":
+        raise ValueError("`compress` is only supported with `engine='closed_form'`.")
+    dtype = float_dtype(precision)
+    if parallel is not None:
+        if parallel != "cohort":
+            raise ValueError(f"`parallel` must be 'cohort' or None; got {parallel=}")
+        if engine != "closed_form":
+            raise NotImplementedError(
+                "`parallel='cohort'` is only supported with `engine='closed_form'`."
+            )
+    leads = _pretrend_leads(pretrends)
+    if leads is not None:
+        if not closed_form.is_closed_form(time, fes, covariates):
+            raise NotImplementedError(
+                f"`pretrends` requires time fixed effects only i.e. `fes={time!r}` "
+                "and no covariates."
+            )
+        if not prep:
+            raise ValueError("`pretrends` requires `prep=True`.")
 
+    if cache is True:
+        cache = default_cache
+    elif cache is False:
+        cache = None
+    if bootstrap is not None and not _sparse_path(
+        sparse, engine, cache, horizons, weighted=aweight is not None
+    ):
+        raise NotImplementedError(
+            "`bootstrap` requires the influence contributions of the sparse "
+            "path; estimate with `sparse=True` or `engine='closed_form'`."
+        )
+    by = [by] if isinstance(by, str) else list(by or [])
+    clusters = [clusters] if isinstance(clusters, str) else list(clusters or [])
+
+    collect_engine = "streaming" if streaming else "auto"
+    prep_key = None
     if prep:
         params = did_imp.DidImpParams(
             group=group,
@@ -179,19 +992,56 @@ def estimate(
             unit=unit,
             outcome="dY",
         )
-        data = (
-            data.sort(unit, time)
-            # assigns relative time K and treatment D
-            .pipe(did_imp.prep_data, params)
-            .with_columns(
-                iwtr=pl.lit(1),  #  TODO: custom iwtr should be passed by user
-                dY=pl.col(outcome).diff().over(unit),
-                maxK=pl.col("K").max().over(unit),
-            )
-            .drop_nulls(subset="dY")
+        columns = required_columns(
+            data.collect_schema().names(),
+            outcome=outcome,
+            group=group,
+            time=time,
+            unit=unit,
+            cluster_var=cluster_var,
+            fes=fes,
+            covariates=covariates,
+            weights=weights,
+            aweight=aweight,
+            by=by,
+            clusters=clusters,
         )
+        constant = [*constant_columns(columns, time, covariates=covariates), *by]
+        if cache is not None and isinstance(data, pl.DataFrame):
+            data, encoding, prep_key = cached_prep_data(
+                cache,
+                data,
+                outcome=outcome,
+                group=group,
+                time=time,
+                unit=unit,
+                columns=columns,
+                collect_engine=collect_engine,
+                aweight=aweight,
+                lag_time=leads is not None,
+                constant=constant,
+                precision=precision,
+            )
+        else:
+            data, encoding = prep_data(
+                data,
+                outcome=outcome,
+                group=group,
+                time=time,
+                unit=unit,
+                columns=columns,
+                collect_engine=collect_engine,
+                aweight=aweight,
+                lag_time=leads is not None,
+                constant=constant,
+                precision=precision,
+            )
     else:
         # Assumes data is already transformed ready for estimation
+        data = data.lazy().collect(engine=collect_engine)
+        if data.schema[outcome].is_float():
+            data = data.with_columns(pl.col(outcome).cast(dtype))
+        encoding = KeyEncoding(unit=unit, time=time, group=group)
         params = did_imp.DidImpParams(
             group=group,
             time=time,
@@ -199,34 +1049,147 @@ def estimate(
             outcome=outcome,
         )
 
-    if weights is None:
-        weights = []
-
-    if horizons:
-        match horizons:
-            case "event":
-                data = data.pipe(assign_weights_horizon, id_col=unit)
-                weights = data.select(pl.selectors.matches("horizon|average")).columns
-            case list() if all(isinstance(x, int) for x in horizons):
-                data = data.pipe(assign_weights_horizon, k_vals=horizons)
-                weights = data.select(pl.selectors.matches("horizon|average")).columns
-            case "static":
-                data = data.pipe(assign_weights_agg, id_col=unit)
-                weights.append("treat")
-            case "all":
-                data = data.pipe(assign_weights_horizon, id_col=unit).pipe(
-                    assign_weights_agg, id_col=unit
-                )
-                weights = data.select(pl.selectors.matches("horizon|average")).columns
-            case _:
-                raise ValueError(
-                    f"Invalid type for horizons:\n{type(horizons)=}\n{horizons=}"
-                )
-    if not horizons and len(weights) == 0:
-        raise ValueError(
-            "`horizons=None` provided but also no weights are specified. "
-            "At least one horizon or weight must be provided."
+    fit = partial(
+        _fit,
+        params=params,
+        encoding=encoding,
+        cluster_var=cluster_var,
+        clusters=clusters,
+        fes=fes,
+        covariates=covariates,
+        weights=weights or [],
+        horizons=horizons,
+        leads=leads,
+        prep=prep,
+        sparse=sparse,
+        engine=engine,
+        cache=cache,
+        compress=compress,
+        precision=precision,
+        parallel=parallel,
+        n_jobs=n_jobs,
+        bootstrap=bootstrap,
+        multipliers=multipliers,
+        seed=seed,
+        retain=retain,
+        spill_dir=spill_dir,
+        weighted=aweight is not None,
+    )
+    if not by:
+        return fit(data, prep_key=prep_key)
+    return _fit_by(data, by, fit, prep_key=prep_key, n_jobs=n_jobs)
+
+
+def _sparse_path(
+    sparse: bool,
+    engine: Literal["regression", "closed_form"],
+    cache: LRUCache | None,
+    horizons: Literal["static", "event", "all"] | list[int] | None,
+    weighted: bool,
+) -> bool:
+    """Whether `estimate` runs on the sparse path; see `sparse`.
+
+    The regression is also fit on the sparse path with a `cache` (unless
+    `horizons="static"`) or unit weights, since only there the imputation
+    is cached and weighted.
+    """
+    cached = cache is not None and horizons != "static"
+    return sparse or engine == "closed_form" or cached or weighted
+
+
+def _fit(
+    data: pl.DataFrame,
+    params: did_imp.DidImpParams,
+    encoding: KeyEncoding,
+    prep_key: tuple | None,
+    cluster_var: str | None,
+    clusters: list[str],
+    fes: str | None,
+    covariates: list[str] | None,
+    weights: list[str],
+    horizons: Literal["static", "event", "all"] | list[int] | None,
+    leads: list[int] | None,
+    prep: bool,
+    sparse: bool,
+    engine: Literal["regression", "closed_form"],
+    cache: LRUCache | None,
+    compress: bool,
+    precision: Precision,
+    parallel: Literal["cohort"] | None,
+    n_jobs: int | None,
+    bootstrap: int | None,
+    multipliers: closed_form.Multipliers,
+    seed: int | None,
+    retain: RetainPolicy,
+    spill_dir: str | Path | None,
+    weighted: bool = False,
+) -> DidSwResult:
+    """Estimation stage of `estimate` on prepared data; see `estimate`.
+
+    With `weighted` the imputation is weighted by the unit weights `iwtr`.
+    """
+    unit = params.unit
+    n_obs = data.shape[0]
+    if compress:
+        data = compress_units(
+            data,
+            group=params.group,
+            time=params.time,
+            unit=unit,
+            cluster=unique([cluster_var or unit, *clusters]),
+            outcome=params.outcome,
+        )
+        if prep_key is not None:
+            prep_key = (*prep_key, "compress", cluster_var or unit, *clusters)
+
+    weights_key = (
+        None
+        if prep_key is None
+        else (prep_key, tuple(data.columns), tuple(weights), precision)
+    )
+    horizons_key = tuple(horizons) if isinstance(horizons, list) else horizons
+
+    if _sparse_path(sparse, engine, cache, horizons, weighted):
+        res = _estimate_sparse(
+            data,
+            params,
+            cluster_var=cluster_var,
+            fes=fes,
+            covariates=covariates,
+            weights=weights,
+            horizons=horizons,
+            prep=prep,
+            engine=engine,
+            leads=leads,
+            cache=cache,
+            weights_key=(
+                None if weights_key is None else (*weights_key, "sparse", horizons_key)
+            ),
+            precision=precision,
+            parallel=parallel,
+            n_jobs=n_jobs,
+            weighted=weighted,
+        )
+        if bootstrap is not None:
+            res = _bootstrap(
+                res, cluster_var or unit, B=bootstrap, kind=multipliers, seed=seed
+            )
+        res = replace(
+            res,
+            N=n_obs,
+            closed_form_imputation=closed_form.is_closed_form(
+                params.time, fes, covariates
+            ),
         )
+        return res.decode(encoding, cluster_var or unit, retain, spill_dir)
+
+    data, weights = _cached(
+        cache,
+        None if weights_key is None else (*weights_key, "dense", horizons_key),
+        lambda: _assign_weights(
+            data, horizons, unit=unit, weights=weights, precision=precision
+        ),
+    )
 
     imp_res = did_imp.estimate(
         data,
@@ -243,10 +1206,642 @@ def estimate(
     estimates = imp_res.estimates.with_columns(
         pl.col("term").str.replace("^horizon", "")
     )
-    return DidSwResult(
+    if leads is not None:
+        pre_estimates, _, _ = _estimate_pretrends(
+            data.with_row_index("row"),
+            params,
+            cluster_var,
+            leads,
+            precision=precision,
+        )
+        estimates = pl.concat([estimates, pre_estimates], how="diagonal_relaxed")
+    res = DidSwResult(
         estimates,
         N=data.shape[0],
         data=data,
         names=imp_res.names,
         mod=imp_res.mod,
     )
+    return res.decode(encoding, cluster_var or unit, retain, spill_dir)
+
+
+def _fit_by(
+    data: pl.DataFrame,
+    by: list[str],
+    fit: Callable[..., DidSwResult],
+    prep_key: tuple | None,
+    n_jobs: int | None = None,
+) -> DidSwResult:
+    """Estimates of each group of `by` on the shared prepared data.
+
+    The groups are estimated concurrently in a thread pool.
+
+    Returns:
+        A `DidSwResult` with the estimates of the groups stacked with the
+        `by` columns first, the total number of observations and the result
+        of each group in `groups`.
+    """
+    schema = data.select(by).schema
+    keys = data.select(by).unique().sort(by).rows()
+    parts = data.partition_by(by, as_dict=True)
+
+    def _fit_group(key: tuple) -> DidSwResult:
+        return fit(
+            parts[key],
+            prep_key=None if prep_key is None else (*prep_key, "by", tuple(by), key),
+        )
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        groups = dict(zip(keys, pool.map(_fit_group, keys)))
+
+    estimates = pl.concat(
+        [
+            res.estimates.select(
+                *[
+                    pl.lit(value, dtype=schema[col]).alias(col)
+                    for col, value in zip(by, key)
+                ],
+                pl.all(),
+            )
+            for key, res in groups.items()
+        ],
+        how="diagonal_relaxed",
+    )
+    return DidSwResult(
+        estimates,
+        N=sum(res.N for res in groups.values()),
+        data=None,
+        names=list(
+            dict.fromkeys(name for res in groups.values() for name in res.names)
+        ),
+        mod=None,
+        groups=groups,
+    )
+
+
+def _bootstrap(
+    res: DidSwResult,
+    cluster: str,
+    B: int,
+    kind: closed_form.Multipliers,
+    seed: int | None,
+) -> DidSwResult:
+    """Adds the multiplier bootstrap of the influence contributions; see `estimate`."""
+    psi = res._psi()
+    band = [
+        term.removeprefix("horizon")
+        for term in res.influence["term"].unique().to_list()
+        if term.startswith("horizon")
+    ]
+    estimates = closed_form.bootstrap(
+        res.estimates, psi, cluster, B=B, kind=kind, band=band, seed=seed
+    )
+    return replace(res, estimates=estimates)
+
+
+# Arguments of `estimate` that do not change its result
+_UNKEYED = ("data", "cache", "spill_dir", "n_jobs", "disk_cache")
+
+
+def _deterministic(arguments: dict[str, Any]) -> bool:
+    """Whether the result of `arguments` is reproducible, and can be cached."""
+    return arguments.get("bootstrap") is None or arguments.get("seed") is not None
+
+
+def _disk_cached(arguments: dict[str, Any]) -> DidSwResult:
+    """`estimate` cached on the fingerprint of the data and the arguments."""
+    if not _deterministic(arguments):
+        return estimate(**{**arguments, "disk_cache": None})
+    disk_cache = DiskCache.of(arguments["disk_cache"])
+    data = arguments["data"]
+    if arguments["prep"]:
+        by = arguments["by"]
+        columns = required_columns(
+            data.collect_schema().names(),
+            **{
+                k: arguments[k]
+                for k in (
+                    "outcome",
+                    "group",
+                    "time",
+                    "unit",
+                    "cluster_var",
+                    "fes",
+                    "covariates",
+                    "weights",
+                    "aweight",
+                )
+            },
+            by=[by] if isinstance(by, str) else list(by or []),
+            clusters=(
+                [arguments["clusters"]]
+                if isinstance(arguments["clusters"], str)
+                else list(arguments["clusters"] or [])
+            ),
+        )
+    else:
+        columns = data.collect_schema().names()
+    if isinstance(data, pl.LazyFrame):
+        engine = "streaming" if arguments["streaming"] else "auto"
+        data = data.select(columns).collect(engine=engine)
+    key = hash_key(
+        "estimate",
+        fingerprint(data.select(columns)),
+        sorted((k, v) for k, v in arguments.items() if k not in _UNKEYED),
+    )
+    if (res := disk_cache.get(key)) is not None:
+        return res.retain(arguments["retain"], spill_dir=arguments["spill_dir"])
+    res = estimate(**{**arguments, "data": data, "disk_cache": None})
+    disk_cache.put(key, _persistable(res))
+    return res
+
+
+def _persistable(res: DidSwResult) -> DidSwResult:
+    """`res` without the fitted model and spill file, which are not cached."""
+    return replace(
+        res,
+        mod=None,
+        data_path=None,
+        _spill=None,
+        groups=None
+        if res.groups is None
+        else {k: _persistable(v) for k, v in res.groups.items()},
+    )
+
+
+IPC_SUFFIXES = (".arrow", ".ipc", ".feather")
+
+
+def estimate_from_parquet(
+    source: str | Path | list[str] | list[Path],
+    outcome: str,
+    group: str,
+    time: str,
+    unit: str,
+    time_range: tuple[Any, Any] | None = None,
+    cohorts: list[Any] | None = None,
+    **kwargs,
+) -> DidSwResult:
+    """
+    Estimate the SWDD estimator on Parquet or Arrow IPC files.
+
+    The files are scanned lazily and the prep up to the differenced outcome
+    is collected once with the streaming engine of polars (see `streaming`
+    of `estimate`), so only the columns used for estimation are read and the
+    panel is never materialized with all of its columns. This is not
+    out-of-core: the projected panel (the used columns of the filtered rows)
+    is estimated in memory and must fit in memory.
+    Filters on `time` and `group` are pushed down to the scan, such that row
+    groups outside of `time_range` or `cohorts` are skipped using the file
+    statistics (sort the files by `time` or `group` for the best pruning).
+
+    Args:
+        source: Path, glob or list of paths to Parquet or IPC files. Files
+            ending in `.arrow`, `.ipc` or `.feather` are read as IPC.
+        time_range: Optional (first, last) period to keep (both inclusive).
+        cohorts: Optional values of `group` to keep; include the value of
+            the never-treated if these should be used as controls.
+        **kwargs: Keyword arguments passed on to `estimate`. With
+            `disk_cache`, the result is keyed by the path, size and
+            modification time of the files (see `cache.file_fingerprint`)
+            instead of their content, so the files are not read on a hit. A
+            `bootstrap` without a `seed` is not cached.
+
+    Returns:
+        The `DidSwResult` of `estimate`.
+    """
+    disk_cache = kwargs.pop("disk_cache", None)
+    if disk_cache is not None and _deterministic(kwargs):
+        arguments = dict(
+            source=source,
+            outcome=outcome,
+            group=group,
+            time=time,
+            unit=unit,
+            time_range=time_range,
+            cohorts=cohorts,
+            **kwargs,
+        )
+        key = hash_key(
+            "estimate_from_parquet",
+            file_fingerprint(source),
+            sorted(
+                (k, v)
+                for k, v in arguments.items()
+                if k not in ("source", *_UNKEYED)
+            ),
+        )
+        disk_cache = DiskCache.of(disk_cache)
+        if (res := disk_cache.get(key)) is not None:
+            return res.retain(
+                kwargs.get("retain", "full"), spill_dir=kwargs.get("spill_dir")
+            )
+        res = estimate_from_parquet(**arguments)
+        disk_cache.put(key, _persistable(res))
+        return res
+    paths = source if isinstance(source, list) else [source]
+    if all(str(path).endswith(IPC_SUFFIXES) for path in paths):
+        data = pl.scan_ipc(source)
+    else:
+        data = pl.scan_parquet(source)
+
+    if time_range is not None:
+        data = data.filter(pl.col(time).is_between(*time_range, closed="both"))
+    if cohorts is not None:
+        data = data.filter(pl.col(group).is_in(cohorts))
+
+    return estimate(
+        data,
+        outcome=outcome,
+        group=group,
+        time=time,
+        unit=unit,
+        streaming=True,
+        **kwargs,
+    )
+
+
+def _sparse_weights(
+    data: pl.DataFrame,
+    horizons: Literal["static", "event", "all"] | list[int] | None,
+    weights: list[str],
+    precision: Precision = "float64",
+) -> pl.DataFrame:
+    k_vals, _, average = _horizon_terms(data, horizons, weights, sparse=True)
+    if k_vals is None:
+        return sparse_weights_from_columns(data, weights, precision=precision)
+    return assign_weights_sparse(
+        data, k_vals=k_vals, average=average, precision=precision
+    )
+
+
+def _estimate_sparse(
+    data: pl.DataFrame,
+    params: did_imp.DidImpParams,
+    cluster_var: str | None,
+    fes: str | None,
+    covariates: list[str] | None,
+    weights: list[str],
+    horizons: Literal["static", "event", "all"] | list[int] | None,
+    prep: bool,
+    engine: Literal["regression", "closed_form"],
+    leads: list[int] | None = None,
+    cache: LRUCache | None = None,
+    weights_key: tuple | None = None,
+    precision: Precision = "float64",
+    parallel: Literal["cohort"] | None = None,
+    n_jobs: int | None = None,
+    weighted: bool = False,
+) -> DidSwResult:
+    """Point estimates with sparse weights; see `estimate`.
+
+    The pretrends of `leads` are estimated in closed form off the same
+    prepared rows as the horizons. With `engine="regression"` the imputed
+    effects of `did_imp.compute_tes` (of `fixed_effects.impute` if
+    `weighted`) are cached on the fingerprint of the columns of the
+    imputation, and the projection of the weights on the fixed effects on
+    that and the fingerprint of the weights.
+    """
+    tes_data = data.with_row_index("row")
+    cluster = cluster_var or params.unit
+    if parallel == "cohort":
+        tes = closed_form.impute_effects(
+            tes_data, time=params.time, outcome=params.outcome
+        )
+        estimates, sp_weights, psi = _estimate_cohorts(
+            tes,
+            horizons,
+            weights,
+            time=params.time,
+            group=params.group,
+            cluster=cluster,
+            n_jobs=n_jobs,
+            precision=precision,
+        )
+        return _with_pretrends(
+            data,
+            tes_data,
+            params,
+            cluster_var,
+            leads,
+            estimates,
+            sp_weights,
+            psi,
+            precision=precision,
+        )
+
+    sp_weights = _cached(
+        cache,
+        weights_key,
+        lambda: _sparse_weights(data, horizons, weights, precision=precision),
+    )
+    if engine == "closed_form":
+        tes = closed_form.impute_effects(
+            tes_data, time=params.time, outcome=params.outcome
+        )
+    else:
+        if not prep:
+            tes_data = tes_data.pipe(did_imp.prep_data, params)
+        # The imputation only depends on the sample, `fes` and the covariates
+        # and is reused across clusters, weights and horizons
+        imputed = ["row", params.outcome, "K", "iwtr"]
+        for formula in [fes, *(covariates or [])]:
+            imputed += formula_columns(formula or "", tes_data.columns)
+        tes_key = None
+        if cache is not None:
+            tes_key = (
+                "tes",
+                fingerprint(tes_data.select(unique(imputed))),
+                fes,
+                tuple(covariates or []),
+            )
+
+        def _impute() -> pl.DataFrame:
+            if weighted:
+                return fixed_effects.impute(
+                    tes_data, params.outcome, fes, covariates=covariates
+                )
+            return did_imp.compute_tes(
+                tes_data,
+                form=did_imp.Form(
+                    outcome=params.outcome,
+                    fes=fes,
+                    xform=" + ".join(covariates) if covariates else "0",
+                ),
+            ).data.select("row", "Yhat", "Yadj")
+
+        imputation = _cached(cache, tes_key, _impute)
+        tes = tes_data.join(imputation, on="row", how="left", maintain_order="left")
+        if tes.filter(
+            closed_form.treated(), pl.col("Yadj").is_null() | pl.col("Yadj").is_nan()
+        ).height:
+            raise ValueError(
+                "Treated observations without an imputed counterfactual; their "
+                "effects are not identified by the untreated observations."
+            )
+    estimates = aggregate_sparse(tes, sp_weights)
+    psi = None
+    if engine == "closed_form":
+        psi = closed_form.influence(
+            tes,
+            sp_weights,
+            time=params.time,
+            group=params.group,
+            cluster=cluster,
+        )
+        estimates = closed_form.inference(estimates, psi)
+    else:
+        # The projection of the weights on the fixed effects and covariates is
+        # cached as well, such that a sweep over clusters only sums the
+        # influence by cluster
+        projection = _cached(
+            cache,
+            None if tes_key is None else (*tes_key, fingerprint(sp_weights)),
+            lambda: fixed_effects.projection(
+                tes, sp_weights, fes, covariates=covariates
+            ),
+        )
+        psi = closed_form.influence(
+            tes,
+            sp_weights,
+            time=params.time,
+            group=params.group,
+            cluster=cluster,
+            projection=projection,
+        )
+        estimates = closed_form.inference(estimates, psi)
+    return _with_pretrends(
+        data,
+        tes_data,
+        params,
+        cluster_var,
+        leads,
+        estimates,
+        sp_weights,
+        psi,
+        precision=precision,
+    )
+
+
+def _with_pretrends(
+    data: pl.DataFrame,
+    tes_data: pl.DataFrame,
+    params: did_imp.DidImpParams,
+    cluster_var: str | None,
+    leads: list[int] | None,
+    estimates: pl.DataFrame,
+    sp_weights: pl.DataFrame,
+    psi: pl.DataFrame | None,
+    precision: Precision = "float64",
+) -> DidSwResult:
+    """Result of `_estimate_sparse` with the pretrends of `leads` appended."""
+    estimates = estimates.with_columns(pl.col("term").str.replace("^horizon", ""))
+    if leads is not None:
+        pre_estimates, pre_weights, pre_psi = _estimate_pretrends(
+            tes_data, params, cluster_var, leads, precision=precision
+        )
+        estimates = pl.concat([estimates, pre_estimates], how="diagonal_relaxed")
+        sp_weights = pl.concat([sp_weights, pre_weights])
+        if psi is not None:
+            psi = pl.concat([psi, pre_psi])
+    return DidSwResult(
+        estimates,
+        N=data.shape[0],
+        data=data,
+        names=sp_weights["term"].unique(maintain_order=True).to_list(),
+        mod=None,
+        weights=sp_weights,
+        influence=psi,
+        params=params,
+    )
+
+
+def _estimate_cohorts(
+    tes: pl.DataFrame,
+    horizons: Literal["static", "event", "all"] | list[int] | None,
+    weights: list[str],
+    time: str,
+    group: str,
+    cluster: str,
+    n_jobs: int | None = None,
+    precision: Precision = "float64",
+) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    """Closed-form estimates with the work split by cohort; see `estimate`.
+
+    Given the period means of the untreated rows (in `tes`) and the sums of
+    `iwtr` normalizing the horizon weights, the weights of a row only depend
+    on its own unit, and the point estimates and influence contributions are
+    sums over cohorts. The sums are computed once on the full panel and the
+    weights, estimates and influence contributions of each cohort are then
+    computed in a thread pool and added up.
+
+    Args:
+        tes: Output of `closed_form.impute_effects` with a `row` index column.
+
+    Returns:
+        The estimates with inference, the (row, term, weight) triplets and
+        the influence contributions.
+    """
+    k_vals, terms, average = _horizon_terms(tes, horizons, weights, sparse=True)
+    if k_vals is not None:
+        totals = _horizon_totals(tes, k_vals)
+        treated_total = tes["iwtr"].filter(tes["K"].ge(0)).sum() if average else None
+    # Untreated rows collapsed to (cluster, period) cells, which preserves the
+    # sums of `iwtr` and `Yadj * iwtr` used by `closed_form.influence`
+    untreated = (
+        tes.lazy()
+        .filter(closed_form.treated().not_())
+        .group_by(unique([cluster, time]))
+        .agg(
+            iwtr=pl.col("iwtr").sum(),
+            Yadj=pl.col("Yadj").mul("iwtr").sum() / pl.col("iwtr").sum(),
+        )
+        .collect()
+        .lazy()
+    )
+
+    def _cohort(
+        part: pl.DataFrame,
+    ) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+        if k_vals is None:
+            w = sparse_weights_from_columns(part, weights, precision=precision)
+        else:
+            w = _sparse_weights_with_totals(
+                part, k_vals, totals, treated_total, precision=precision
+            )
+        w = w.with_columns(row=part["row"].gather(w["row"]))
+        psi = closed_form.influence(
+            part, w, time=time, group=group, cluster=cluster, untreated=untreated
+        )
+        return aggregate_sparse(part, w), w, psi
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        parts = list(pool.map(_cohort, tes.partition_by(group)))
+
+    order = pl.DataFrame({"term": terms}).with_row_index("order")
+    estimates = (
+        pl.concat([est for est, _, _ in parts])
+        .group_by("term")
+        .agg(pl.col("estimate").sum())
+        .join(order, on="term", how="inner")
+        .sort("order")
+        .drop("order")
+    )
+    sp_weights = (
+        pl.concat([w for _, w, _ in parts])
+        .join(order, on="term", how="inner")
+        .sort("order", "row")
+        .drop("order")
+    )
+    psi = (
+        pl.concat([psi for _, _, psi in parts])
+        .group_by("term", cluster)
+        .agg(pl.col("psi").sum())
+        .sort("term", cluster)
+    )
+    return closed_form.inference(estimates, psi), sp_weights, psi
+
+
+def _pretrend_leads(pretrends: bool | int | list[int] | None) -> list[int] | None:
+    """Leads of the `pretrends` argument of `estimate`; empty for all leads."""
+    match pretrends:
+        case None | False:
+            return None
+        case True:
+            return []
+        case int() if pretrends >= 1:
+            return list(range(2, pretrends + 2))
+        case list() if pretrends and all(
+            isinstance(x, int) and x >= 2 for x in pretrends
+        ):
+            return sorted(set(pretrends))
+        case _:
+            raise ValueError(
+                "`pretrends` must be True, a positive int or a list of leads >= 2;"
+                f" got {pretrends=}"
+            )
+
+
+def _estimate_pretrends(
+    data: pl.DataFrame,
+    params: did_imp.DidImpParams,
+    cluster_var: str | None,
+    leads: list[int],
+    precision: Precision = "float64",
+) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    """Closed-form pretrend estimates; see `estimate`.
+
+    The pretrends of Harmon (2022) are the SWDD horizons of the panel with
+    time reversed, where a treated unit's last untreated period E - 1 is the
+    reference and the pretrend of lead l the change of the outcome from E - 1
+    back to E - l. Instead of appending a time-reversed copy of the untreated
+    rows to the panel, the reversed first differences are read off the
+    original rows: each untreated row r with a previous row defines the
+    reversed observation -dY_r in period `tlag` with horizon
+    K = -K_{r-1} - 2. All reversed observations are controls and those of
+    treated units with 0 <= K <= max(leads) - 2 are also treated; treated
+    observations in periods without controls cannot be imputed and are
+    dropped.
+
+    Args:
+        data: Prepared data with a `row` index column and the `tlag` column.
+
+    Returns:
+        The estimates, the (row, term, weight) triplets indexing the rows of
+        `data` and the influence contributions of the terms `pretrend{l}`.
+    """
+    time, unit = params.time, params.unit
+    cluster = cluster_var or unit
+    k_vals = [lead - 2 for lead in leads] if leads else None
+    reversed_ = (
+        data.lazy()
+        .filter(closed_form.treated().not_(), pl.col("tlag").is_not_null())
+        .select(
+            unique(["row", unit, params.group, cluster, "iwtr"])
+            + [
+                pl.col("tlag").alias(time),
+                pl.col("K").sub(pl.col(time).sub("tlag")).neg().sub(2),
+                pl.col(params.outcome).neg(),
+            ]
+        )
+    )
+    controls = reversed_.with_columns(K=pl.lit(None, dtype=pl.Int64))
+    means = closed_form.period_means(controls, time, params.outcome).lazy()
+    treated = (
+        reversed_.filter(
+            pl.col("K").is_between(0, max(k_vals)) if k_vals else pl.col("K").ge(0)
+        )
+        .join(means, on=time, how="inner")
+        .with_columns(
+            Yadj=pl.col(params.outcome).sub("Yhat"),
+            maxK=pl.col("K").max().over(unit),
+        )
+        .sort(unit, time)
+        .collect()
+    )
+    if treated.height == 0:
+        raise ValueError("No pre-treatment periods to estimate pretrends.")
+
+    weights = assign_weights_sparse(
+        treated, k_vals=k_vals, prefix="pretrend", precision=precision
+    )
+    weights = weights.with_columns(
+        row=treated["row"].gather(weights["row"]),
+        # Pretrends are horizons + 2 cf. `rename_horizons`
+        term=pl.format(
+            "pretrend{}",
+            pl.col("term").str.strip_prefix("pretrend").cast(pl.Int64).add(2),
+        ),
+    )
+    psi = closed_form.influence(
+        treated,
+        weights,
+        time=time,
+        group=params.group,
+        cluster=cluster,
+        untreated=controls.join(means, on=time, how="inner").with_columns(
+            Yadj=pl.col(params.outcome).sub("Yhat")
+        ),
+    )
+    estimates = closed_form.inference(aggregate_sparse(treated, weights), psi)
+    return estimates, weights, psi
@@ -0,0 +1,259 @@
+"""
+Projections on the fixed effects and covariates of the untreated observations.
+
+With fixed effects Z the variance estimator of BJS weights the residual of an
+untreated observation by v_0 = -iwtr * Z_0 b, where b solves the normal
+equations Z_0' diag(iwtr) Z_0 b = Z_1' w_1 of the treated weights w_1 of a
+term. The equations are solved for all terms at once by alternating over the
+fixed effects (Gauss-Seidel), the same iterations as the demeaning of the
+imputation regression; with a single fixed effect one sweep is exact. Without
+fixed effects the imputed counterfactuals are zero and v_0 = 0.
+
+Covariates X are partialled out (Frisch-Waugh-Lovell): X_0 is demeaned on the
+fixed effects with the same sweeps and the coefficients of X solve the small
+normal equations of the demeaned covariates. The same sweeps give the
+imputation regression weighted by the unit weights `iwtr` (see `impute`),
+which the regression of `did_imp` does not support.
+"""
+
+import numpy as np
+import polars as pl
+from formulaic import model_matrix
+
+from did_sw.closed_form import treated
+from did_sw.prep import formula_columns
+
+
+__all__ = [
+    "fe_columns",
+    "covariate_matrix",
+    "projection",
+    "impute",
+]
+
+
+def fe_columns(fes: str) -> list[list[str]]:
+    """Columns of each fixed effect, e.g. [["t"], ["id", "E"]] for "t + id^E"."""
+    return [[col.strip() for col in fe.split("^")] for fe in fes.split("+")]
+
+
+def covariate_matrix(data: pl.DataFrame, covariates: list[str]) -> np.ndarray:
+    """Model matrix of the covariates with a row per row of `data`.
+
+    The formula parts of `covariates` are joined by "+" as in the imputation
+    regression, with an intercept unless the formula removes it (e.g. "-1");
+    rank deficient columns (e.g. the intercept with fixed effects) are left
+    to the pseudo-inverse of the normal equations.
+    """
+    formula = " + ".join(covariates)
+    columns = formula_columns(formula, data.columns)
+    mm = model_matrix(formula, data.select(columns).to_pandas(), na_action="raise")
+    return np.asarray(mm, dtype=np.float64)
+
+
+def _group_sums(codes: np.ndarray, values: np.ndarray, n: int) -> np.ndarray:
+    """Sums of the columns of `values` by the `n` levels of `codes`."""
+    return np.column_stack(
+        [np.bincount(codes, values[:, j], minlength=n) for j in range(values.shape[1])]
+    )
+
+
+def _solve(
+    dims: list[tuple[np.ndarray, np.ndarray]],
+    omega: np.ndarray,
+    width: int,
+    tol: float,
+    maxiter: int,
+) -> tuple[list[np.ndarray], np.ndarray]:
+    """Solution b of the normal equations of the fixed effects.
+
+    Args:
+        dims: Level codes of the untreated rows and right-hand sides (one row
+            per level, one column per equation) of each fixed effect.
+        omega: Weights of the untreated rows.
+        width: Number of equations.
+
+    Returns:
+        The coefficients of the levels of each fixed effect and the fitted
+        values Z_0 b.
+    """
+    fitted = np.zeros((len(omega), width))
+    denoms = [np.bincount(codes, omega, minlength=len(b)) for codes, b in dims]
+    coefs = [np.zeros_like(b) for _, b in dims]
+    for _ in range(maxiter):
+        change = 0.0
+        for k, (codes, b) in enumerate(dims):
+            rest = fitted - coefs[k][codes]
+            sums = _group_sums(codes, omega[:, None] * rest, len(b))
+            coef = (b - sums) / denoms[k][:, None]
+            change = max(change, np.abs(coef - coefs[k]).max(initial=0.0))
+            coefs[k] = coef
+            fitted = rest + coef[codes]
+        if len(dims) <= 1 or change <= tol * max(np.abs(fitted).max(initial=0.0), 1.0):
+            return coefs, fitted
+    raise RuntimeError(
+        f"The fixed effects projection did not converge in {maxiter} sweeps."
+    )
+
+
+def projection(
+    tes: pl.DataFrame,
+    weights: pl.DataFrame,
+    fes: str | None,
+    covariates: list[str] | None = None,
+    tol: float = 1e-12,
+    maxiter: int = 10_000,
+) -> pl.DataFrame:
+    """Weights of the untreated observations in the influence of each term.
+
+    Args:
+        tes: Imputed effects with a `row` index, `K`, `iwtr` and the columns
+            of `fes` and `covariates`.
+        weights: (row, term, weight) triplet table of the treated rows.
+        fes: Fixed effects of the imputation regression (None for none).
+        covariates: Covariates of the imputation regression; see
+            `covariate_matrix`.
+        tol: Tolerance of the largest change of the fitted values of a sweep
+            relative to their largest absolute value.
+        maxiter: Maximum number of sweeps.
+
+    Returns:
+        DataFrame with columns (term, row, v) for the untreated rows; pass it
+        as `projection` to `closed_form.influence`.
+    """
+    untreated = tes.filter(treated().not_())
+    terms = weights["term"].unique(maintain_order=True).to_list()
+    term_index = pl.DataFrame({"term": terms}).with_row_index("_term")
+    omega = untreated["iwtr"].cast(pl.Float64).to_numpy()
+
+    X0 = X1w = None
+    if covariates:
+        X = covariate_matrix(tes, covariates)
+        rows = tes.select("row").with_row_index("_pos")
+        pos = untreated.join(rows, on="row", maintain_order="left")["_pos"]
+        X0 = X[pos.to_numpy()]
+        w = weights.join(rows, on="row").join(term_index, on="term")
+        weight = w["weight"].cast(pl.Float64).to_numpy()
+        weighted = weight[:, None] * X[w["_pos"].to_numpy()]
+        # X_1' w_1 with a row per covariate and a column per term
+        X1w = _group_sums(w["_term"].to_numpy(), weighted, len(terms)).T
+
+    dims = []
+    for cols in fe_columns(fes) if fes else []:
+        levels = untreated.select(cols).unique(maintain_order=True)
+        levels = levels.with_row_index("_level")
+        codes = untreated.select(cols).join(
+            levels, on=cols, how="left", maintain_order="left", nulls_equal=True
+        )["_level"].to_numpy()
+        rhs = (
+            weights.join(tes.select("row", *cols), on="row", how="left")
+            .join(levels, on=cols, how="left", nulls_equal=True)
+            .join(term_index, on="term")
+        )
+        if rhs["_level"].null_count():
+            raise ValueError(
+                f"Treated observations with levels of `{'^'.join(cols)}` without "
+                "untreated observations; their effects are not identified."
+            )
+        sums = rhs.group_by("_level", "_term").agg(
+            pl.col("weight").cast(pl.Float64).sum()
+        )
+        b = np.zeros((levels.height, len(terms)))
+        level, term = sums["_level"].to_numpy(), sums["_term"].to_numpy()
+        b[level, term] = sums["weight"].to_numpy()
+        if X0 is not None:
+            # Demeaning of the covariates on the fixed effects
+            b = np.hstack([b, _group_sums(codes, omega[:, None] * X0, levels.height)])
+        dims.append((codes, b))
+
+    _, fitted = _solve(
+        dims, omega, len(terms) + (0 if X0 is None else X0.shape[1]), tol, maxiter
+    )
+    if X0 is not None:
+        fitted, X0_tilde = fitted[:, : len(terms)], X0 - fitted[:, len(terms) :]
+        gram = X0_tilde.T @ (omega[:, None] * X0_tilde)
+        beta = np.linalg.pinv(gram, hermitian=True) @ (
+            X1w - X0.T @ (omega[:, None] * fitted)
+        )
+        fitted = fitted + X0_tilde @ beta
+
+    return (
+        pl.DataFrame(-omega[:, None] * fitted, schema=terms)
+        .with_columns(row=untreated["row"])
+        .unpivot(index="row", variable_name="term", value_name="v")
+        .select("term", "row", "v")
+    )
+
+
+def impute(
+    tes: pl.DataFrame,
+    outcome: str,
+    fes: str | None,
+    covariates: list[str] | None = None,
+    tol: float = 1e-12,
+    maxiter: int = 10_000,
+) -> pl.DataFrame:
+    """Imputation regression weighted by the unit weights `iwtr`.
+
+    The regression of `outcome` on the fixed effects and covariates is fit
+    by weighted least squares on the untreated rows and predicts the
+    counterfactuals of all rows.
+
+    Args:
+        tes: Data with a `row` index, `K`, `iwtr`, `outcome` and the columns
+            of `fes` and `covariates`.
+        outcome: Outcome of the imputation regression.
+        fes: Fixed effects of the imputation regression (None for none).
+        covariates: Covariates of the imputation regression; see
+            `covariate_matrix`.
+        tol: Tolerance of the sweeps; see `projection`.
+        maxiter: Maximum number of sweeps.
+
+    Returns:
+        DataFrame with columns (row, Yhat, Yadj); the counterfactuals of rows
+        with levels of the fixed effects without untreated rows are null.
+    """
+    untreated = tes.filter(treated().not_())
+    omega = untreated["iwtr"].cast(pl.Float64).to_numpy()
+    Y0 = untreated[outcome].cast(pl.Float64).to_numpy()[:, None]
+    X = None
+    if covariates:
+        X = covariate_matrix(tes, covariates)
+        rows = tes.select("row").with_row_index("_pos")
+        pos = untreated.join(rows, on="row", maintain_order="left")["_pos"]
+        # Outcome and covariates are demeaned with the same sweeps
+        Y0 = np.hstack([Y0, X[pos.to_numpy()]])
+
+    dims, codes_all = [], []
+    for cols in fe_columns(fes) if fes else []:
+        levels = untreated.select(cols).unique(maintain_order=True)
+        levels = levels.with_row_index("_level")
+        codes = untreated.select(cols).join(
+            levels, on=cols, how="left", maintain_order="left", nulls_equal=True
+        )["_level"].to_numpy()
+        dims.append((codes, _group_sums(codes, omega[:, None] * Y0, levels.height)))
+        codes_all.append(
+            tes.select(cols).join(
+                levels, on=cols, how="left", maintain_order="left", nulls_equal=True
+            )["_level"]
+        )
+
+    coefs, fitted = _solve(dims, omega, Y0.shape[1], tol, maxiter)
+    beta = np.zeros(0)
+    if X is not None:
+        resid = Y0 - fitted
+        y_tilde, X0_tilde = resid[:, 0], resid[:, 1:]
+        gram = X0_tilde.T @ (omega[:, None] * X0_tilde)
+        beta = np.linalg.pinv(gram, hermitian=True) @ (
+            X0_tilde.T @ (omega * y_tilde)
+        )
+
+    yhat = np.zeros(tes.height) if X is None else X @ beta
+    identified = np.ones(tes.height, dtype=bool)
+    for coef, codes in zip(coefs, codes_all):
+        # Level effects of the outcome net of those of the covariates
+        effects = coef[:, 0] - coef[:, 1:] @ beta
+        identified &= codes.is_not_null().to_numpy()
+        yhat += effects[codes.fill_null(0).to_numpy()]
+    yhat = pl.Series("Yhat", np.where(identified, yhat, np.nan)).fill_nan(None)
+    return tes.select("row", yhat, Yadj=pl.col(outcome) - pl.lit(yhat))
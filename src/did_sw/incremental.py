@@ -0,0 +1,539 @@
+"""
+Incremental SWDD estimates for growing panels and rolling windows.
+
+With time fixed effects and no covariates (the closed form) the estimate of
+horizon h is num_h / n_h with
+
+    num_h = sum over units i with maxK_i >= h of
+            sum over treated rows of i with K <= h of iwtr * (dY - Yhat_t)
+    n_h = sum of iwtr over rows with K == h,
+
+and the aggregate effect is sum_h num_h / sum_h n_h. Appending a period only
+adds rows in that period, so the counterfactuals Yhat_t of the earlier
+periods do not change. The state keeps the last row and the running sum of
+the imputed effects of each unit, and a new period only updates the cells of
+the horizons between the previous and the new maxK of its units.
+`estimate_rolling` keeps the same sums by cohort and period for a window of
+calendar time and subtracts the first differences leaving the window.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import polars as pl
+
+from did_sw import closed_form
+from did_sw.prep import no_controls_error, prep_data
+from did_sw.validate import never_treated
+
+
+__all__ = [
+    "SwddState",
+    "estimate_rolling",
+]
+
+
+@dataclass
+class SwddState:
+    """Sufficient statistics of the closed-form SWDD estimates of a panel.
+
+    Build the state with `SwddState.fit` and update it with `append`; the
+    point estimates of `horizons="all"` are returned by `estimates`.
+    Standard errors are not updated incrementally; use `estimate` on the full
+    panel for inference.
+
+    Args:
+        outcome: Outcome column.
+        group: Cohort column (integer periods).
+        time: Time column (integer periods).
+        unit: Unit column.
+        aweight: Optional unit weights column.
+        units: Per unit the cohort, weight `iwtr`, last period, last
+            outcome, maxK and the running sum `U` of iwtr * (dY - Yhat) over
+            its treated rows.
+        cells: Per horizon h the sums `num` and `n`.
+        last_period: Last period of the panel.
+    """
+
+    outcome: str
+    group: str
+    time: str
+    unit: str
+    aweight: str | None
+    units: pl.DataFrame
+    cells: pl.DataFrame
+    last_period: int
+
+    @classmethod
+    def fit(
+        cls,
+        data: pl.DataFrame | pl.LazyFrame,
+        outcome: str,
+        group: str,
+        time: str,
+        unit: str,
+        aweight: str | None = None,
+    ) -> "SwddState":
+        """State of the full panel `data`; see `estimate` for the arguments."""
+        columns = list(dict.fromkeys([unit, time, group, outcome, aweight or unit]))
+        # A single read of `data`, shared by the prep and the unit table
+        raw = data.lazy().select(columns).collect()
+        prepped, encoding = prep_data(
+            raw,
+            outcome=outcome,
+            group=group,
+            time=time,
+            unit=unit,
+            columns=columns,
+            aweight=aweight,
+        )
+        if encoding.periods is not None:
+            raise ValueError("`SwddState` requires integer periods.")
+        prepped = encoding.decode(prepped, periods=[])
+        state = cls(
+            outcome=outcome,
+            group=group,
+            time=time,
+            unit=unit,
+            aweight=aweight,
+            units=pl.DataFrame(),
+            cells=pl.DataFrame(),
+            last_period=raw[time].max(),
+        )
+
+        tes = closed_form.impute_effects(prepped, time=time).filter(
+            closed_form.treated()
+        )
+        running = tes.group_by(unit).agg(U=_effect().sum())
+        state.units = (
+            raw.sort(unit, time)
+            .group_by(unit)
+            .agg(
+                pl.col(group).first(),
+                state._weight().first().alias("iwtr"),
+                pl.col(time).last().alias("_last"),
+                pl.col(outcome).last().alias("_Y"),
+                state._relative_time().max().alias("maxK"),
+            )
+            .join(running, on=unit, how="left")
+            .with_columns(pl.col("U").fill_null(0.0))
+        )
+        state.cells = pl.concat(
+            [
+                tes.with_columns(h=pl.int_ranges("K", pl.col("maxK").add(1)))
+                .explode("h")
+                .group_by("h")
+                .agg(num=_effect().sum()),
+                tes.group_by(h="K").agg(n=pl.col("iwtr").cast(pl.Float64).sum()),
+            ],
+            how="diagonal_relaxed",
+        ).pipe(_sum_cells)
+        return state
+
+    def _weight(self) -> pl.Expr:
+        if self.aweight is None:
+            return pl.lit(1.0)
+        return pl.col(self.aweight).cast(pl.Float64)
+
+    def _relative_time(self) -> pl.Expr:
+        never = never_treated(self.group, pl.Int64)
+        return pl.when(never.not_()).then(pl.col(self.time).sub(pl.col(self.group)))
+
+    def append(self, new: pl.DataFrame) -> "SwddState":
+        """Updates the state with the rows of a new period.
+
+        The cost is proportional to the number of new rows and the number of
+        horizons their units add, plus a hash join with the unit table. Only
+        the rows of the units in `new` are written to `units`.
+
+        Args:
+            new: Rows of a single period after `last_period` with the unit,
+                time, cohort, outcome (and weight) columns. Units not seen
+                before start their panel in this period.
+        """
+        periods = new[self.time].unique()
+        if periods.len() != 1 or periods[0] <= self.last_period:
+            raise ValueError(
+                f"`new` must hold a single period after {self.last_period}."
+            )
+        if new[self.unit].is_duplicated().any():
+            raise ValueError("`new` has duplicate units.")
+        period = periods[0]
+        new = new.select(
+            self.unit,
+            self.time,
+            self.outcome,
+            *([self.aweight] if self.aweight else []),
+            pl.col(self.group).alias("_group"),
+        ).join(self.units.with_row_index("_row"), on=self.unit, how="left")
+        moved = pl.col("_last").is_not_null() & pl.col("_group").ne_missing(
+            pl.col(self.group)
+        )
+        if new.select(moved.any()).item():
+            raise ValueError(f"Units of `new` changed their cohort `{self.group}`.")
+        rows = new.with_columns(
+            pl.coalesce(self.group, "_group").alias(self.group),
+            pl.coalesce("iwtr", self._weight()).alias("iwtr"),
+        ).with_columns(
+            K=self._relative_time(),
+            dY=pl.col(self.outcome).sub("_Y"),
+        )
+
+        # Counterfactual of the new period from its untreated rows
+        means = closed_form.period_means(rows.drop_nulls("dY"), self.time)
+        yhat = means["Yhat"][0] if means.height else None
+        treated = rows.filter(closed_form.treated(), pl.col("dY").is_not_null())
+        if yhat is None and treated.height:
+            raise no_controls_error([period])
+        treated = treated.with_columns(
+            Yadj=pl.col("dY").sub(yhat),
+            maxK=pl.col("maxK").fill_null(-1).clip(lower_bound=-1),
+        ).with_columns(U_new=pl.col("U").fill_null(0.0).add(_effect()))
+        increments = pl.concat(
+            [
+                # Horizons between the previous and the new maxK gain the
+                # imputed effects of the earlier rows of the unit
+                treated.with_columns(h=pl.int_ranges(pl.col("maxK").add(1), "K"))
+                .explode("h")
+                .drop_nulls("h")
+                .group_by("h")
+                .agg(num=pl.col("U").fill_null(0.0).sum()),
+                treated.group_by(h="K").agg(
+                    num=pl.col("U_new").sum(), n=pl.col("iwtr").cast(pl.Float64).sum()
+                ),
+            ],
+            how="diagonal_relaxed",
+        )
+        self.cells = pl.concat(
+            [self.cells, increments], how="diagonal_relaxed"
+        ).pipe(_sum_cells)
+
+        updated = (
+            rows.select(
+                "_row",
+                self.unit,
+                self.group,
+                "iwtr",
+                pl.col(self.time).alias("_last"),
+                pl.col(self.outcome).alias("_Y"),
+                pl.max_horizontal("maxK", "K").alias("maxK"),
+                "U",
+            )
+            .update(treated.select(self.unit, U="U_new"), on=self.unit, how="left")
+            .with_columns(pl.col("U").fill_null(0.0))
+        )
+        seen = updated.filter(pl.col("_row").is_not_null())
+        if seen.height:
+            self._write_units(
+                seen["_row"], seen.select("_last", "_Y", "maxK", "U")
+            )
+        self.units.extend(
+            updated.filter(pl.col("_row").is_null())
+            .select(self.units.columns)
+            .cast(self.units.schema)
+        )
+        self.last_period = period
+        return self
+
+    def _write_units(self, index: pl.Series, values: pl.DataFrame):
+        """Writes `values` to the rows `index` of `units`.
+
+        The columns are written in place unless they are shared with another
+        frame, e.g. a `units` table held by the caller.
+        """
+        columns = self.units.get_columns()
+        self.units = pl.DataFrame()
+        for i, column in enumerate(columns):
+            if column.name in values.columns:
+                columns[i] = column.scatter(
+                    index, values[column.name].cast(column.dtype)
+                )
+        self.units = pl.DataFrame(columns)
+
+    def estimates(self) -> pl.DataFrame:
+        """Point estimates of the horizons and the aggregate effect.
+
+        Returns:
+            DataFrame with columns (term, estimate) as in `estimate` with
+            `horizons="all"`.
+        """
+        return _estimates(self.cells)
+
+
+def _effect() -> pl.Expr:
+    return pl.col("iwtr").cast(pl.Float64).mul(pl.col("Yadj"))
+
+
+def _sum_cells(cells: pl.DataFrame) -> pl.DataFrame:
+    return (
+        cells.group_by("h")
+        .agg(pl.col("num").fill_null(0.0).sum(), pl.col("n").fill_null(0.0).sum())
+        .sort("h")
+    )
+
+
+def _estimates(cells: pl.DataFrame) -> pl.DataFrame:
+    cells = cells.filter(pl.col("n").gt(0)).sort("h")
+    return pl.concat(
+        [
+            cells.select(
+                term=pl.col("h").cast(pl.String),
+                estimate=pl.col("num") / pl.col("n"),
+            ),
+            cells.select(
+                term=pl.lit("average"),
+                estimate=pl.col("num").sum() / pl.col("n").sum(),
+            ),
+        ]
+    )
+
+
+def estimate_rolling(
+    data: pl.DataFrame | pl.LazyFrame,
+    outcome: str,
+    group: str,
+    time: str,
+    unit: str,
+    window: int = 36,
+    step: int = 1,
+    aweight: str | None = None,
+) -> pl.DataFrame:
+    """Closed-form SWDD estimates over rolling windows of calendar time.
+
+    Each window of `window` consecutive periods gives the point estimates of
+    `estimate(data.filter(start <= time <= end), ..., fes=time,
+    horizons="all", engine="closed_form")`. The panel is prepped once and
+    the per-period sums of the imputed effects are updated as the window
+    moves: the periods entering the window are added and the first
+    differences of the periods leaving it are subtracted.
+
+    Args:
+        data: Panel with integer periods.
+        outcome: Outcome column.
+        group: Cohort column.
+        time: Time column.
+        unit: Unit column.
+        window: Number of periods in each window.
+        step: Number of periods between the ends of consecutive windows.
+        aweight: Optional unit weights column.
+
+    Returns:
+        DataFrame with columns (end, term, estimate) where `end` is the last
+        period of the window.
+    """
+    if window < 2 or step < 1:
+        raise ValueError("`window` must be at least 2 and `step` at least 1.")
+    columns = list(dict.fromkeys([unit, time, group, outcome, aweight or unit]))
+    prepped, encoding = prep_data(
+        data,
+        outcome=outcome,
+        group=group,
+        time=time,
+        unit=unit,
+        columns=columns,
+        aweight=aweight,
+        lag_time=True,
+    )
+    if encoding.periods is not None:
+        raise ValueError("`estimate_rolling` requires integer periods.")
+    prepped = encoding.decode(prepped, periods=[])
+    first, last = prepped.select(pl.col("tlag").min(), pl.col(time).max()).row(0)
+    ends = range(first + window - 1, last + 1, step)
+    if not ends:
+        raise ValueError(f"`window` is longer than the {last - first + 1} periods.")
+
+    state = _RollingWindow.empty(prepped, unit=unit, group=group, time=time)
+    state.move(ends[0] - window + 1, ends[0])
+    results = [state.estimates().with_columns(end=pl.lit(ends[0]))]
+    for end in ends[1:]:
+        state.move(end - window + 1, end)
+        results.append(state.estimates().with_columns(end=pl.lit(end)))
+    return pl.concat(results).select("end", "term", "estimate")
+
+
+@dataclass
+class _RollingWindow:
+    """Sums of the first differences of a window `start <= time <= end`.
+
+    A row is in the window if its period and the period `tlag` of the
+    previous row of its unit are. `cells` are the sums of the treated rows by
+    cohort, period and last period `L` of the unit in the window (null for
+    the units observed at `end`), `controls` the sums of the untreated rows by
+    period and `units` the last period of each unit. `treated` holds the
+    treated rows sorted by unit and `offsets` the first row and row count of
+    each unit in it, so that moving a unit between keys only reads its rows.
+    """
+
+    rows: dict[int, pl.DataFrame]
+    lags: dict[int, pl.DataFrame]
+    treated: pl.DataFrame
+    offsets: pl.DataFrame
+    unit: str
+    group: str
+    time: str
+    start: int
+    end: int
+    units: pl.DataFrame
+    cells: pl.DataFrame
+    controls: pl.DataFrame
+
+    @classmethod
+    def empty(
+        cls, prepped: pl.DataFrame, unit: str, group: str, time: str
+    ) -> "_RollingWindow":
+        rows = prepped.select(
+            unit,
+            time,
+            group,
+            "tlag",
+            "K",
+            w=pl.col("iwtr").cast(pl.Float64),
+            dY=pl.col("dY").cast(pl.Float64),
+        ).drop_nulls("dY")
+        start = prepped["tlag"].min()
+        treated = rows.filter(closed_form.treated()).sort(unit, time)
+        return cls(
+            rows={k[0]: v for k, v in rows.partition_by(time, as_dict=True).items()},
+            lags={k[0]: v for k, v in rows.partition_by("tlag", as_dict=True).items()},
+            treated=treated,
+            offsets=treated.with_row_index("first")
+            .group_by(unit)
+            .agg(pl.col("first").first(), n=pl.len()),
+            unit=unit,
+            group=group,
+            time=time,
+            start=start,
+            end=start - 1,
+            units=rows.select(unit, L=pl.col(time)).clear(),
+            cells=_sums(rows.with_columns(L=pl.col(time)), [group, time, "L"]).clear(),
+            controls=_sums(rows, [time]).clear(),
+        )
+
+    def move(self, start: int, end: int):
+        """Moves the window to `start <= time <= end`."""
+        leaving = [self.lags[p] for p in range(self.start, start) if p in self.lags]
+        self.start = start
+        if leaving:
+            self._update(
+                pl.concat(leaving).filter(pl.col(self.time).le(self.end)), sign=-1.0
+            )
+        self.units = self.units.filter(pl.col("L").ge(start))
+        for period in range(self.end + 1, end + 1):
+            self._add(period)
+
+    def _add(self, period: int):
+        new = self.rows.get(period, self.rows[next(iter(self.rows))].clear())
+        present = new.select(self.unit)
+        # Units leaving or returning to the panel change their key `L`
+        changed = pl.concat(
+            [
+                self.units.filter(pl.col("L").eq(self.end)).join(
+                    present, on=self.unit, how="anti"
+                ),
+                self.units.filter(pl.col("L").lt(self.end)).join(
+                    present, on=self.unit, how="semi"
+                ),
+            ]
+        )
+        if changed.height:
+            moved = self._rows_of(changed).filter(
+                pl.col("tlag").ge(self.start), pl.col(self.time).le(self.end)
+            )
+            moved = moved.join(changed, on=self.unit)
+            self.cells = _accumulate(
+                self.cells,
+                [
+                    _sums(self._keyed(moved), [self.group, self.time, "L"], -1.0),
+                    _sums(
+                        moved.with_columns(
+                            L=pl.when(pl.col("L").eq(self.end))
+                            .then(pl.lit(self.end))
+                            .otherwise(None)
+                        ),
+                        [self.group, self.time, "L"],
+                    ),
+                ],
+            )
+        self.units = pl.concat(
+            [
+                self.units.join(present, on=self.unit, how="anti"),
+                present.with_columns(L=pl.lit(period, self.units["L"].dtype)),
+            ]
+        )
+        self.end = period
+        self._update(new.filter(pl.col("tlag").ge(self.start)), sign=1.0)
+
+    def _rows_of(self, units: pl.DataFrame) -> pl.DataFrame:
+        """Treated rows of `units`, read by their offsets in `treated`."""
+        spans = units.join(self.offsets, on=self.unit)
+        first = spans["first"].to_numpy().astype(np.int64)
+        n = spans["n"].to_numpy().astype(np.int64)
+        index = np.arange(n.sum()) + np.repeat(first - (np.cumsum(n) - n), n)
+        return self.treated[pl.Series(index)]
+
+    def _keyed(self, rows: pl.DataFrame) -> pl.DataFrame:
+        """Adds the key `L` of the units of `rows`."""
+        return (
+            rows.drop("L", strict=False)
+            .join(self.units, on=self.unit, how="left")
+            .with_columns(
+                L=pl.when(pl.col("L").ne(self.end)).then("L").otherwise(None)
+            )
+        )
+
+    def _update(self, rows: pl.DataFrame, sign: float):
+        treated = rows.filter(closed_form.treated())
+        self.cells = _accumulate(
+            self.cells,
+            [_sums(self._keyed(treated), [self.group, self.time, "L"], sign)],
+        )
+        self.controls = _accumulate(
+            self.controls,
+            [_sums(rows.filter(closed_form.treated().not_()), [self.time], sign)],
+        )
+
+    def estimates(self) -> pl.DataFrame:
+        yhat = self.controls.select(self.time, Yhat=pl.col("D") / pl.col("W"))
+        cells = (
+            self.cells.join(yhat, on=self.time, how="left")
+            .with_columns(
+                K=pl.col(self.time).sub(pl.col(self.group)),
+                maxK=pl.coalesce("L", pl.lit(self.end)).sub(pl.col(self.group)),
+                num=pl.col("D").sub(pl.col("Yhat").mul("W")),
+            )
+        )
+        missing = cells.filter(pl.col("Yhat").is_null())[self.time].unique().sort()
+        if missing.len():
+            raise no_controls_error(missing.to_list())
+        return _estimates(
+            pl.concat(
+                [
+                    cells.with_columns(h=pl.int_ranges("K", pl.col("maxK").add(1)))
+                    .explode("h")
+                    .group_by("h")
+                    .agg(pl.col("num").sum()),
+                    cells.group_by(h="K").agg(n=pl.col("W").sum()),
+                ],
+                how="diagonal_relaxed",
+            ).pipe(_sum_cells)
+        )
+
+
+def _sums(rows: pl.DataFrame, keys: list[str], sign: float = 1.0) -> pl.DataFrame:
+    """Signed sums of the weighted first differences by `keys`."""
+    return rows.group_by(keys).agg(
+        D=pl.col("w").mul("dY").sum().mul(sign),
+        W=pl.col("w").sum().mul(sign),
+        count=pl.len().cast(pl.Int64).mul(int(sign)),
+    )
+
+
+def _accumulate(sums: pl.DataFrame, updates: list[pl.DataFrame]) -> pl.DataFrame:
+    """Adds `updates` to `sums` and drops the empty cells."""
+    keys = [c for c in sums.columns if c not in ("D", "W", "count")]
+    return (
+        pl.concat([sums, *updates], how="vertical_relaxed")
+        .group_by(keys)
+        .agg(pl.col("D", "W", "count").sum())
+        .filter(pl.col("count").gt(0))
+    )
@@ -0,0 +1,222 @@
+"""
+Estimation plans for running many SWDD specifications on the same panel.
+
+All specifications of a plan share the outcome, group, time and unit columns,
+so the sort, `did_imp.prep_data`, first-differencing and weight assignment
+are done once for the plan and each specification only runs its own
+imputation and aggregation.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Literal
+
+import polars as pl
+
+from did_sw.encoding import KeyEncoding
+from did_sw.estimator import (
+    DidSwResult,
+    assign_weights_agg,
+    assign_weights_horizon,
+    estimate,
+)
+from did_sw.prep import prep_data, required_columns
+
+
+__all__ = [
+    "EstimationPlan",
+    "Spec",
+]
+
+
+@dataclass(frozen=True)
+class Spec:
+    """A single specification of `estimate` in an `EstimationPlan`.
+
+    See `estimate` for the arguments; list arguments are stored as tuples such
+    that identical specifications are only estimated once.
+    """
+
+    cluster_var: str | None = None
+    fes: str | None = None
+    covariates: tuple[str, ...] = ()
+    weights: tuple[str, ...] = ()
+    horizons: Literal["static", "event", "all"] | tuple[int, ...] | None = "event"
+    engine: Literal["regression", "closed_form"] = "regression"
+
+    def weight_columns(self, event: list[int]) -> list[str]:
+        """Weight columns used by the specification.
+
+        Args:
+            event: Horizons of `horizons="event"`.
+        """
+        match self.horizons:
+            case "event":
+                return [f"horizon{h}" for h in event]
+            case tuple():
+                return [f"horizon{h}" for h in self.horizons]
+            case "all":
+                return [f"horizon{h}" for h in event] + ["average"]
+            case "static":
+                return list(self.weights) + ["treat"]
+            case None:
+                return list(self.weights)
+            case _:
+                raise ValueError(
+                    f"Invalid type for horizons:\n{type(self.horizons)=}\n"
+                    f"{self.horizons=}"
+                )
+
+
+@dataclass
+class EstimationPlan:
+    """
+    Plan of SWDD specifications estimated off one shared preprocessing.
+
+    Example:
+        plan = (
+            EstimationPlan(data, outcome="Y", group="E", time="t", unit="id")
+            .add("unit", cluster_var="id", fes="t")
+            .add("cluster", cluster_var="clust", fes="t", horizons="all")
+        )
+        estimates = plan.run(n_jobs=4)
+    """
+
+    data: pl.DataFrame | pl.LazyFrame
+    outcome: str
+    group: str
+    time: str
+    unit: str
+    specs: dict[str, Spec] = field(default_factory=dict)
+    results: dict[str, DidSwResult] = field(default_factory=dict)
+    encoding: KeyEncoding | None = field(default=None, init=False)
+
+    def add(
+        self,
+        name: str | None = None,
+        cluster_var: str | None = None,
+        fes: str | None = None,
+        covariates: list[str] | None = None,
+        weights: list[str] | None = None,
+        horizons: Literal["static", "event", "all"] | list[int] | None = "event",
+        engine: Literal["regression", "closed_form"] = "regression",
+    ) -> "EstimationPlan":
+        """Adds a specification to the plan; see `estimate` for the arguments.
+
+        Args:
+            name: Name of the specification (defaults to `spec{i}`).
+        """
+        name = name or f"spec{len(self.specs)}"
+        if name in self.specs:
+            raise ValueError(f"Specification {name!r} already in plan.")
+        if engine == "closed_form" and horizons == "static":
+            raise ValueError("`horizons='static'` is not supported with `closed_form`.")
+        self.specs[name] = Spec(
+            cluster_var=cluster_var,
+            fes=fes,
+            covariates=tuple(covariates or ()),
+            weights=tuple(weights or ()),
+            horizons=tuple(horizons) if isinstance(horizons, list) else horizons,
+            engine=engine,
+        )
+        return self
+
+    def prepare(self) -> tuple[pl.DataFrame, list[int]]:
+        """Shared preprocessing and weights of all specifications.
+
+        The key encoding of the prepared data is stored in `encoding`.
+
+        Returns:
+            The prepared data with the union of the weight columns of all
+            specifications and the horizons of `horizons="event"`.
+        """
+        columns = self.data.collect_schema().names()
+        required = {
+            col
+            for spec in self.specs.values()
+            for col in required_columns(
+                columns,
+                outcome=self.outcome,
+                group=self.group,
+                time=self.time,
+                unit=self.unit,
+                cluster_var=spec.cluster_var,
+                fes=spec.fes,
+                covariates=list(spec.covariates),
+                weights=list(spec.weights),
+            )
+        }
+        data, self.encoding = prep_data(
+            self.data,
+            outcome=self.outcome,
+            group=self.group,
+            time=self.time,
+            unit=self.unit,
+            columns=[col for col in columns if col in required],
+        )
+
+        k_max = data["K"].max()
+        event = list(range(int(k_max) + 1)) if isinstance(k_max, int) else []
+        horizons = sorted(
+            {
+                int(col.removeprefix("horizon"))
+                for spec in self.specs.values()
+                if spec.horizons is not None
+                for col in spec.weight_columns(event)
+                if col.startswith("horizon")
+            }
+        )
+        if horizons:
+            data = data.pipe(assign_weights_horizon, id_col=self.unit, k_vals=horizons)
+        if any(spec.horizons in ("all", "static") for spec in self.specs.values()):
+            data = data.pipe(assign_weights_agg, id_col=self.unit)
+        return data, event
+
+    def run(self, n_jobs: int | None = None) -> pl.DataFrame:
+        """Estimates all specifications.
+
+        Identical specifications are only estimated once and the distinct
+        specifications are estimated concurrently in a thread pool.
+
+        Args:
+            n_jobs: Number of worker threads (defaults to the default of
+                `ThreadPoolExecutor`).
+
+        Returns:
+            The estimates of all specifications stacked with a `spec` column
+            holding the name of the specification. The `DidSwResult` of each
+            specification is stored in `results`.
+        """
+        if not self.specs:
+            raise ValueError("No specifications in plan.")
+        data, event = self.prepare()
+
+        def _estimate(spec: Spec) -> DidSwResult:
+            res = estimate(
+                data,
+                outcome="dY",
+                group=self.group,
+                time=self.time,
+                unit=self.unit,
+                cluster_var=spec.cluster_var,
+                fes=spec.fes,
+                covariates=list(spec.covariates) or None,
+                weights=spec.weight_columns(event),
+                horizons=None,  # Weights are assigned in `prepare`
+                prep=False,
+                engine=spec.engine,
+            )
+            return res.decode(self.encoding, cluster=spec.cluster_var or self.unit)
+
+        distinct = list(dict.fromkeys(self.specs.values()))
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            fitted = dict(zip(distinct, pool.map(_estimate, distinct)))
+
+        self.results = {name: fitted[spec] for name, spec in self.specs.items()}
+        return pl.concat(
+            [
+                res.estimates.select(pl.lit(name).alias("spec"), pl.all())
+                for name, res in self.results.items()
+            ],
+            how="diagonal",
+        )
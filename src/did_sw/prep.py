@@ -0,0 +1,241 @@
+"""
+Preparation of the panel for the SWDD estimator.
+
+The used columns are selected from the input, the unit and time keys are
+dictionary-encoded, and the panel is sorted and first-differenced before the
+relative times and treatment indicators of `did_imp` are assigned. These
+helpers are shared by `estimate`, the estimation plans and the incremental
+estimates.
+"""
+
+import re
+from typing import Literal
+
+import polars as pl
+
+import did_imp
+
+from did_sw.cache import LRUCache, fingerprint
+from did_sw.encoding import KeyEncoding
+from did_sw.sorting import is_sorted_by
+from did_sw.validate import validate_panel
+
+
+__all__ = [
+    "Precision",
+    "float_dtype",
+    "formula_columns",
+    "required_columns",
+    "constant_columns",
+    "prep_data",
+    "cached_prep_data",
+    "unique",
+    "no_controls_error",
+]
+
+
+Precision = Literal["float64", "float32"]
+
+
+def float_dtype(precision: Precision) -> pl.DataType:
+    """Storage dtype of the weights and differenced outcomes of `precision`."""
+    match precision:
+        case "float64":
+            return pl.Float64
+        case "float32":
+            return pl.Float32
+        case _:
+            raise ValueError(
+                f"`precision` must be 'float64' or 'float32'; got {precision=}"
+            )
+
+
+def formula_columns(formula: str, columns: list[str]) -> list[str]:
+    """Columns of `columns` referenced in a formula part e.g. `C(X2) : C(t)`."""
+    names = set(re.findall(r"[A-Za-z_][A-Za-z0-9_.]*", formula))
+    return [col for col in columns if col in names]
+
+
+def required_columns(
+    columns: list[str],
+    outcome: str,
+    group: str,
+    time: str,
+    unit: str,
+    cluster_var: str | None = None,
+    fes: str | None = None,
+    covariates: list[str] | None = None,
+    weights: list[str] | None = None,
+    aweight: str | None = None,
+    by: list[str] | None = None,
+    clusters: list[str] | None = None,
+) -> list[str]:
+    """Columns of the input data needed for estimation in input order."""
+    required = {outcome, group, time, unit, *(by or []), *(clusters or [])}
+    if aweight:
+        required.add(aweight)
+    for formula in [cluster_var, fes, *(covariates or [])]:
+        if formula:
+            required.update(formula_columns(formula, columns))
+    required.update(weights or [])
+    return [col for col in columns if col in required]
+
+
+def constant_columns(
+    columns: list[str],
+    time: str,
+    covariates: list[str] | None = None,
+) -> list[str]:
+    """Columns of the covariates that must be constant within units."""
+    constant = []
+    for formula in covariates or []:
+        constant += [col for col in formula_columns(formula, columns) if col != time]
+    return unique(constant)
+
+
+def prep_data(
+    data: pl.DataFrame | pl.LazyFrame,
+    outcome: str,
+    group: str,
+    time: str,
+    unit: str,
+    columns: list[str],
+    collect_engine: Literal["auto", "streaming"] = "auto",
+    aweight: str | None = None,
+    lag_time: bool = False,
+    constant: list[str] | None = None,
+    precision: Precision = "float64",
+    cache: LRUCache | None = None,
+) -> tuple[pl.DataFrame, KeyEncoding]:
+    """Sorts the data and computes K, D, iwtr, dY and maxK.
+
+    Only `columns` are selected from `data`; the dictionary encoding of
+    non-integer unit and time keys (see `did_sw.encoding`), the sort and the
+    windows `dY` and `tlag` are part of one lazy plan that is collected once
+    with `collect_engine` before the prep of `did_imp`, such that the sort and
+    all windows run on integer codes. Only the unit and period labels of the
+    encoding are collected beforehand. A `DataFrame` already sorted by unit
+    and time skips the sort. The unit weights `iwtr` are `aweight` if given
+    and otherwise one. With `lag_time` the period of the previous row of the
+    unit is added as `tlag` (used for the pretrends). The collected panel is
+    checked with `did_sw.validate.validate_panel` before the prep (with the
+    diagnostics cached in `cache` if given); `constant` are the columns that
+    must be constant within units besides `aweight`. `dY` is stored with the
+    dtype of `precision`.
+
+    Returns:
+        The prepared data with encoded keys and the key encoding.
+    """
+    params = did_imp.DidImpParams(
+        group=group,
+        time=time,
+        unit=unit,
+        outcome="dY",
+    )
+    # Projection of used columns pushed down to the scan of `data`
+    frame = data.lazy().select(columns)
+    encoding = KeyEncoding.fit(frame, unit=unit, time=time, group=group)
+    frame = encoding.encode(frame)
+    # Codes keep the order of the labels, so a sorted input stays sorted
+    if not (isinstance(data, pl.DataFrame) and is_sorted_by(data, unit, time)):
+        frame = frame.sort(unit, time)
+    data = frame.with_columns(
+        dY=pl.col(outcome).diff().over(unit).cast(float_dtype(precision)),
+        **({"tlag": pl.col(time).shift(1).over(unit)} if lag_time else {}),
+    ).collect(engine=collect_engine)
+    validate_panel(
+        data,
+        unit=unit,
+        time=time,
+        group=group,
+        constant=[*([aweight] if aweight else []), *(constant or [])],
+        cache=cache,
+    ).raise_for_errors()
+    data = (
+        data
+        # assigns relative time K and treatment D
+        .pipe(did_imp.prep_data, params)
+        .with_columns(
+            iwtr=pl.lit(1) if aweight is None else pl.col(aweight),
+            maxK=pl.col("K").max().over(unit),
+        )
+        .drop_nulls(subset="dY")
+    )
+    return data, encoding
+
+
+def cached_prep_data(
+    cache: LRUCache,
+    data: pl.DataFrame,
+    outcome: str,
+    group: str,
+    time: str,
+    unit: str,
+    columns: list[str],
+    collect_engine: Literal["auto", "streaming"] = "auto",
+    aweight: str | None = None,
+    lag_time: bool = False,
+    constant: list[str] | None = None,
+    precision: Precision = "float64",
+) -> tuple[pl.DataFrame, KeyEncoding, tuple]:
+    """`prep_data` cached on the fingerprint of `data` and the arguments.
+
+    A cached prep is reused if it has all of `columns`; otherwise the prep is
+    recomputed with the union of the cached and requested columns such that
+    calls with e.g. different clusters share a single cached prep. The
+    validation of `constant` columns on a hit is itself cached.
+
+    Returns:
+        The prepared data, its key encoding and its cache key.
+    """
+    key = (
+        "prep",
+        fingerprint(data),
+        outcome,
+        group,
+        time,
+        unit,
+        aweight,
+        lag_time,
+        precision,
+    )
+    hit = cache.get(key)
+    if hit is not None and set(columns) <= set(hit[0].columns):
+        if constant:
+            validate_panel(
+                data, unit=unit, time=time, group=group, constant=constant, cache=cache
+            ).raise_for_errors()
+        return *hit, key
+    if hit is not None:
+        union = set(columns) | set(hit[0].columns)
+        columns = [col for col in data.columns if col in union]
+    prepped, encoding = prep_data(
+        data,
+        outcome=outcome,
+        group=group,
+        time=time,
+        unit=unit,
+        columns=columns,
+        collect_engine=collect_engine,
+        aweight=aweight,
+        lag_time=lag_time,
+        constant=constant,
+        precision=precision,
+        cache=cache,
+    )
+    cache.put(key, (prepped, encoding))
+    return prepped, encoding, key
+
+
+def unique(cols: list[str]) -> list[str]:
+    """`cols` without duplicates in order of first occurrence."""
+    return list(dict.fromkeys(cols))
+
+
+def no_controls_error(periods: list) -> ValueError:
+    """Error for `periods` with treated but no untreated observations."""
+    return ValueError(
+        f"Periods {periods} have treated but no untreated observations, so "
+        "their treatment effects are not identified; restrict the panel to "
+        "periods with controls (e.g. before the last cohort is treated)."
+    )
@@ -0,0 +1,55 @@
+"""
+Sortedness checks to skip redundant sorts.
+
+Checking whether a frame is sorted by a set of keys is a single O(n) pass
+over the keys, so frames that are already in the right order (e.g. pre-sorted
+Parquet inputs or intermediate results of the pipeline) skip the
+O(n log n) sort.
+"""
+
+import polars as pl
+
+
+__all__ = [
+    "assert_sorted",
+    "is_sorted_by",
+    "sort_by",
+]
+
+
+def _sorted_expr(by: list[str]) -> pl.Expr:
+    """Whether each row is >= the previous row in lexicographic order of `by`.
+
+    Rows with null keys count as out of order.
+    """
+    ordered = pl.lit(True)
+    for col in reversed(by):
+        cur, prev = pl.col(col), pl.col(col).shift(1)
+        ordered = cur.gt(prev) | (cur.eq(prev) & ordered)
+    return ordered.fill_null(False) | pl.int_range(pl.len()).eq(0)
+
+
+def is_sorted_by(df: pl.DataFrame, *by: str) -> bool:
+    """Whether `df` is sorted ascending by the columns `by`.
+
+    Uses the sorted flag of polars for a single key and otherwise checks the
+    lexicographic order of consecutive rows.
+    """
+    if df.height <= 1:
+        return True
+    if len(by) == 1 and df[by[0]].flags["SORTED_ASC"]:
+        return True
+    return df.select(_sorted_expr(list(by)).all()).item()
+
+
+def sort_by(df: pl.DataFrame, *by: str) -> pl.DataFrame:
+    """`df.sort(*by)` unless `df` is already sorted by `by`."""
+    if is_sorted_by(df, *by):
+        return df
+    return df.sort(*by)
+
+
+def assert_sorted(df: pl.DataFrame, *by: str) -> None:
+    """Raises a `ValueError` if `df` is not sorted ascending by `by`."""
+    if not is_sorted_by(df, *by):
+        raise ValueError(f"Data must be sorted by {list(by)}.")
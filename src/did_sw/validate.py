@@ -0,0 +1,196 @@
+"""
+Validation of the panel structure before estimation.
+
+All checks run in a single grouped scan over the units. Given a `cache`, the
+result is cached on the fingerprint of the checked columns, so repeated calls
+of the estimator with `cache=` on the same panel do not rescan it; without a
+cache (e.g. the comparisons) every call rescans the panel.
+"""
+
+from dataclasses import dataclass, field
+
+import polars as pl
+
+from did_sw.cache import LRUCache, fingerprint
+from did_sw.encoding import NEVER_TREATED
+
+
+__all__ = [
+    "PanelDiagnostics",
+    "never_treated",
+    "validate_panel",
+]
+
+
+def never_treated(group: str, dtype: pl.DataType) -> pl.Expr:
+    """Never-treated indicator; null cohorts or 0 / -99 for numeric cohorts."""
+    expr = pl.col(group).is_null()
+    if dtype.is_numeric():
+        expr = expr | pl.col(group).is_in([0, NEVER_TREATED])
+    return expr
+
+
+@dataclass(frozen=True)
+class PanelDiagnostics:
+    """Diagnostics of a panel; counts are numbers of units.
+
+    Args:
+        n_units: Number of units.
+        n_obs: Number of rows.
+        duplicates: Units with duplicate (unit, time) rows.
+        gaps: Units with gaps between their first and last period (allowed
+            by the SWDD estimator, only reported).
+        varying: Columns that must be constant within units mapped to the
+            units where they vary.
+        varying_cohort: Units with more than one cohort.
+        non_absorbing: Units whose treatment switches off again.
+        inconsistent_treatment: Units whose treatment does not start in
+            their cohort period.
+    """
+
+    n_units: int
+    n_obs: int
+    duplicates: int = 0
+    gaps: int = 0
+    varying: dict[str, int] = field(default_factory=dict)
+    varying_cohort: int = 0
+    non_absorbing: int = 0
+    inconsistent_treatment: int = 0
+
+    @property
+    def errors(self) -> list[str]:
+        """Descriptions of the failed checks."""
+        errors = []
+        if self.duplicates:
+            errors.append(f"{self.duplicates} units with duplicate (unit, time) rows")
+        for col, n in self.varying.items():
+            if n:
+                errors.append(f"{n} units where `{col}` varies within the unit")
+        if self.varying_cohort:
+            errors.append(f"{self.varying_cohort} units with more than one cohort")
+        if self.non_absorbing:
+            errors.append(f"{self.non_absorbing} units with non-absorbing treatment")
+        if self.inconsistent_treatment:
+            errors.append(
+                f"{self.inconsistent_treatment} units whose treatment does not "
+                "start in their cohort period"
+            )
+        return errors
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def raise_for_errors(self) -> None:
+        """Raises a `ValueError` listing the failed checks."""
+        if errors := self.errors:
+            raise ValueError("Invalid panel:\n- " + "\n- ".join(errors))
+
+
+def _diagnose(
+    data: pl.DataFrame,
+    unit: str,
+    time: str,
+    group: str,
+    treatment: str | None,
+    constant: list[str],
+) -> PanelDiagnostics:
+    frame = data.lazy()
+    t = pl.col(time)
+    if not data.schema[time].is_integer():
+        # Periods as integers such that gaps are differences of more than one
+        frame = frame.with_columns(_t=t.rank("dense"))
+        t = pl.col("_t")
+    never = never_treated(group, data.schema[group]).first()
+    exprs = [
+        pl.len().alias("n"),
+        t.n_unique().alias("n_periods"),
+        t.max().sub(t.min()).add(1).alias("span"),
+        pl.col(group).n_unique().alias("n_cohorts"),
+        *[pl.col(col).n_unique().alias(f"n_{col}") for col in constant],
+    ]
+    if treatment is not None:
+        d = pl.col(treatment).cast(pl.Int8)
+        exprs += [
+            d.sort_by(time).drop_nulls().diff().min().lt(0).alias("non_absorbing"),
+            # Treated exactly in the periods from the cohort period onwards
+            pl.when(never)
+            .then(d.fill_null(0).max().gt(0))
+            .otherwise(
+                d.ne(pl.col(time).ge(pl.col(group)).cast(pl.Int8))
+                .fill_null(False)
+                .any()
+            )
+            .alias("inconsistent"),
+        ]
+    checks = [
+        pl.len().alias("n_units"),
+        pl.col("n").sum().alias("n_obs"),
+        pl.col("n").gt(pl.col("n_periods")).sum().alias("duplicates"),
+        pl.col("span").gt(pl.col("n_periods")).sum().alias("gaps"),
+        pl.col("n_cohorts").gt(1).sum().alias("varying_cohort"),
+        *[pl.col(f"n_{col}").gt(1).sum().alias(col) for col in constant],
+    ]
+    if treatment is not None:
+        checks += [
+            pl.col("non_absorbing").fill_null(False).sum(),
+            pl.col("inconsistent").sum(),
+        ]
+    res = (
+        frame.group_by(unit).agg(exprs).select(checks).collect().row(0, named=True)
+    )
+    return PanelDiagnostics(
+        n_units=res["n_units"],
+        n_obs=res["n_obs"],
+        duplicates=res["duplicates"],
+        gaps=res["gaps"],
+        varying={col: res[col] for col in constant},
+        varying_cohort=res["varying_cohort"],
+        non_absorbing=res.get("non_absorbing", 0),
+        inconsistent_treatment=res.get("inconsistent", 0),
+    )
+
+
+def validate_panel(
+    data: pl.DataFrame,
+    unit: str,
+    time: str,
+    group: str,
+    treatment: str | None = None,
+    constant: list[str] | None = None,
+    cache: LRUCache | None = None,
+) -> PanelDiagnostics:
+    """Diagnostics of the panel structure in a single grouped scan.
+
+    Checks for duplicate (unit, time) rows, gaps in the periods of a unit,
+    columns varying within units, units with several cohorts and, given a
+    treatment column, non-absorbing treatment and treatment that does not
+    start in the cohort period. Use `PanelDiagnostics.raise_for_errors` to
+    raise on failed checks.
+
+    Args:
+        treatment: Optional 0/1 treatment column.
+        constant: Columns that must be constant within units, e.g.
+            time-invariant covariates or unit weights.
+        cache: Optional cache of the diagnostics keyed on the fingerprint of
+            the checked columns.
+    """
+    constant = [col for col in dict.fromkeys(constant or []) if col != unit]
+    columns = list(dict.fromkeys([unit, time, group, *constant, *[treatment or unit]]))
+    key = None
+    if cache is not None:
+        key = (
+            "validate",
+            fingerprint(data.select(columns)),
+            unit,
+            time,
+            group,
+            treatment,
+            tuple(constant),
+        )
+        if (hit := cache.get(key)) is not None:
+            return hit
+    diagnostics = _diagnose(data, unit, time, group, treatment, constant)
+    if key is not None:
+        cache.put(key, diagnostics)
+    return diagnostics
@@ -0,0 +1,170 @@
+"""
+Test caching utilities.
+"""
+
+import multiprocessing
+import time
+
+import numpy as np
+import polars as pl
+from polars.testing import assert_frame_equal
+
+import did_sw
+from did_sw import comparison, sim
+from did_sw.cache import DiskCache, LRUCache, fingerprint, hash_key
+
+
+def test_fingerprint():
+    df = pl.DataFrame({"id": [1, 1, 2], "t": [1, 2, 1], "Y": [0.1, 0.2, 0.3]})
+    assert fingerprint(df) == fingerprint(df.clone())
+    assert fingerprint(df) != fingerprint(df.with_columns(pl.col("Y").add(1)))
+    assert fingerprint(df) != fingerprint(df.reverse())
+    assert fingerprint(df) != fingerprint(df.rename({"Y": "Z"}))
+
+
+def test_lru_eviction():
+    df = pl.DataFrame({"x": list(range(100))})
+    size = df.estimated_size()
+    cache = LRUCache(max_bytes=2 * size)
+    cache.put("a", df)
+    cache.put("b", df)
+    assert cache.get("a") is df  # "a" is now most recently used
+    cache.put("c", df)
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    assert cache.nbytes == 2 * size
+
+    # Values larger than the budget are not cached
+    cache.put("d", pl.concat([df] * 3))
+    assert "d" not in cache
+    assert cache.get_or_compute("e", lambda: df) is df
+    assert len(cache) == 2
+
+
+def test_lru_entries():
+    """Values other than frames count towards the budget and entries are capped"""
+    cache = LRUCache(max_entries=3)
+    for i in range(5):
+        cache.put(i, {"value": i})
+    assert len(cache) == 3 and 0 not in cache and 4 in cache
+    assert cache.nbytes > 0
+
+
+def test_disk_cache_eviction(tmp_path):
+    df = pl.DataFrame({"x": list(range(1000))})
+    cache = DiskCache(tmp_path, max_bytes=10**9)
+    cache.put("a", {"frame": df, "series": df["x"], "n": 1})
+    value = cache.get("a")
+    assert_frame_equal(value["frame"], df)
+    assert value["series"].equals(df["x"]) and value["n"] == 1
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    size = cache.nbytes
+    cache = DiskCache(tmp_path, max_bytes=2 * size)
+    cache.put("b", {"frame": df, "series": df["x"], "n": 2})
+    time.sleep(0.01)
+    assert cache.get("a")["n"] == 1  # "a" is now most recently used
+    cache.put("c", {"frame": df, "series": df["x"], "n": 3})
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    assert len(cache) == 2
+    cache.clear()
+    assert len(cache) == 0
+
+
+def _put_and_get(args):
+    directory, i = args
+    cache = DiskCache(directory)
+    df = pl.DataFrame({"x": [i % 4] * 100})
+    cache.get_or_compute(str(i % 4), lambda: df)
+    return cache.get(str(i % 4))["x"][0]
+
+
+def test_disk_cache_processes(tmp_path):
+    """Processes share a cache directory"""
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(2) as pool:
+        values = pool.map(_put_and_get, [(tmp_path, i) for i in range(8)])
+    assert values == [i % 4 for i in range(8)]
+    assert len(DiskCache(tmp_path)) == 4
+
+
+def test_estimate_disk_cache(tmp_path):
+    """Results survive the process in the disk cache"""
+    np.random.seed(123)
+    df = sim.simulate_data(N=200)
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="id",
+        fes="t",
+        horizons="all",
+        engine="closed_form",
+        disk_cache=tmp_path,
+    )
+    res = did_sw.estimate(df, **kwargs)
+    cache = DiskCache(tmp_path)
+    assert len(cache) == 1
+    hit = did_sw.estimate(df.lazy(), **kwargs)
+    assert len(cache) == 1
+    assert_frame_equal(hit.estimates, res.estimates)
+    assert_frame_equal(hit.influence, res.influence)
+    assert hit.encoding == res.encoding
+
+    # Other arguments or data are other entries
+    did_sw.estimate(df, **{**kwargs, "horizons": "event"})
+    did_sw.estimate(df.with_columns(pl.col("Y").add(1)), **kwargs)
+    assert len(cache) == 3
+
+    path = tmp_path / "panel.parquet"
+    df.write_parquet(path)
+    res = did_sw.estimate_from_parquet(path, **kwargs)
+    assert len(cache) == 4
+    hit = did_sw.estimate_from_parquet(path, **kwargs)
+    assert_frame_equal(hit.estimates, res.estimates)
+    assert len(cache) == 4
+
+
+def test_disk_cache_unseeded_bootstrap(tmp_path):
+    """A bootstrap without a seed draws anew on every call"""
+    np.random.seed(123)
+    df = sim.simulate_data(N=200)
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        fes="t",
+        engine="closed_form",
+        bootstrap=49,
+        disk_cache=tmp_path,
+    )
+    first = did_sw.estimate(df, **kwargs)
+    second = did_sw.estimate(df, **kwargs)
+    path = tmp_path / "panel.parquet"
+    df.write_parquet(path)
+    did_sw.estimate_from_parquet(path, **kwargs)
+    assert len(DiskCache(tmp_path)) == 0
+    assert not first.estimates.equals(second.estimates)
+
+    did_sw.estimate(df, **kwargs, seed=1)
+    assert len(DiskCache(tmp_path)) == 1
+
+
+def test_hash_key_polars_version(monkeypatch):
+    key = hash_key("estimate", "fingerprint")
+    monkeypatch.setattr(pl, "__version__", "0.0.0")
+    assert hash_key("estimate", "fingerprint") != key
+
+
+def test_full_comparison_disk_cache(tmp_path):
+    np.random.seed(123)
+    df = sim.simulate_data(N=50)
+    res = comparison.full_comparison(df, disk_cache=tmp_path)
+    hit = comparison.full_comparison(df, disk_cache=tmp_path)
+    assert len(DiskCache(tmp_path)) == 1
+    assert_frame_equal(hit.comparison, res.comparison)
+    assert_frame_equal(hit.estimators.swdd, res.estimators.swdd)
@@ -212,3 +212,25 @@ def test_comparison_groups_other():
     assert comps.query_comparisons(E=2, h=0, estimator="sgdd")[
         "E"
     ].unique().sort().to_list() == [-99, 3, 4, 5, 6]
+
+
+def test_equality_aggregate_and_closed_form():
+    """Closed form SWDD estimates equal the manually calculated estimates."""
+    r = did_sw.estimate(
+        base,
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="id",
+        fes="t",
+        horizons="all",
+        engine="closed_form",
+    )
+    ests_model = r.estimates.filter(pl.col("term").ne("average"))
+    ests_manual = comparison.aggregate(ests, agg="dynamic").sort("h")
+    assert np.allclose(ests_model["estimate"].to_numpy(), ests_manual["swdd"])
+
+    est_man = comparison.aggregate(ests, agg="total").select("swdd").item()
+    est_mod = r.estimates.filter(pl.col("term").eq("average"))["estimate"].item()
+    assert np.allclose(est_man, est_mod)
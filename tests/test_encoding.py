@@ -0,0 +1,83 @@
+"""
+Test dictionary encoding of unit and time keys.
+"""
+
+import numpy as np
+import polars as pl
+from polars.testing import assert_frame_equal
+
+import did_sw
+from did_sw import comparison, sim
+from did_sw.encoding import NEVER_TREATED, KeyEncoding
+
+
+np.random.seed(123)
+base = sim.simulate_data(N=150)
+labeled = base.with_columns(
+    id=pl.format("unit-{}", pl.col("id")),
+    t=pl.date(2000, 1, 1).dt.offset_by(pl.format("{}y", pl.col("t"))),
+    E=pl.when(pl.col("E").gt(0)).then(
+        pl.date(2000, 1, 1).dt.offset_by(pl.format("{}y", pl.col("E")))
+    ),
+)
+
+
+def test_encoding_roundtrip():
+    """Codes are contiguous int32, order preserving and decode to the labels"""
+    enc = KeyEncoding.fit(labeled, unit="id", time="t", group="E")
+    encoded = enc.encode(labeled)
+    assert encoded.schema["id"] == pl.Int32 and encoded.schema["t"] == pl.Int32
+    assert encoded["id"].min() == 0 and encoded["id"].max() == enc.units.len() - 1
+    assert encoded["E"].filter(labeled["E"].is_null()).eq(NEVER_TREATED).all()
+    assert_frame_equal(
+        encoded.sort("id", "t").drop("id", "t", "E"),
+        labeled.sort("id", "t").drop("id", "t", "E"),
+    )
+    # K counts periods
+    k = (encoded["t"] - encoded["E"]).filter(labeled["E"].is_not_null())
+    assert k.equals((base["t"] - base["E"]).filter(base["E"] > 0).cast(pl.Int32))
+    assert_frame_equal(enc.decode(encoded), labeled)
+
+    assert KeyEncoding.fit(base, unit="id", time="t", group="E").is_identity
+
+
+def test_estimate_labeled_keys():
+    """String units and date periods give the estimates of integer keys"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="id",
+        fes="t",
+        horizons="all",
+        engine="closed_form",
+    )
+    r = did_sw.estimate(base, **kwargs)
+    r_lab = did_sw.estimate(labeled, **kwargs)
+    assert_frame_equal(r.estimates, r_lab.estimates)
+    assert r_lab.data.schema["id"] == pl.String
+    assert r_lab.data.schema["t"] == pl.Date
+    assert r_lab.influence["id"].str.starts_with("unit-").all()
+
+
+def test_comparisons_labeled_keys():
+    """Comparisons with string ids equal those with integer ids"""
+    df = base.with_columns(id=pl.format("unit-{}", pl.col("id")))
+
+    def _normalize(ests: pl.DataFrame) -> pl.DataFrame:
+        return ests.with_columns(
+            pl.col("id").cast(pl.String).str.strip_prefix("unit-").cast(pl.Int64)
+        ).sort("id", "E", "h")
+
+    assert_frame_equal(
+        _normalize(comparison.compare_estimators(df)),
+        _normalize(comparison.compare_estimators(base)),
+    )
+    comps = comparison.comparisons(df)
+    assert comps.swdd.schema["C_SWDD"] == pl.List(pl.String)
+    ests = comparison.estimators(df, comparison.comparisons_outcomes(comps))
+    assert_frame_equal(
+        _normalize(comparison.compare_ests(ests)),
+        _normalize(comparison.compare_estimators(base)),
+    )
@@ -0,0 +1,126 @@
+"""
+Test the projection of the weights on the fixed effects.
+"""
+
+import numpy as np
+import polars as pl
+import pytest
+
+from did_sw import closed_form, fixed_effects, sim
+from did_sw.estimator import assign_weights_sparse
+from did_sw.prep import prep_data
+
+
+np.random.seed(123)
+df = sim.simulate_data(N=60, E_is=[3, 4, 5, 6, -99]).with_columns(
+    clust=pl.col("id").mod(7)
+)
+prepped, _ = prep_data(
+    df,
+    outcome="Y",
+    group="E",
+    time="t",
+    unit="id",
+    columns=["id", "t", "E", "Y", "clust"],
+)
+tes = closed_form.impute_effects(prepped.with_row_index("row"), time="t")
+weights = assign_weights_sparse(prepped, average=True)
+
+
+def _dummies(data: pl.DataFrame, col: str) -> np.ndarray:
+    levels = tes[col].unique().sort()
+    return np.column_stack([data[col].eq(v).cast(pl.Float64) for v in levels])
+
+
+def test_projection_time():
+    """With time fixed effects the influence equals the closed form"""
+    psi = closed_form.influence(tes, weights, "t", "E", "clust")
+    projected = closed_form.influence(
+        tes,
+        weights,
+        "t",
+        "E",
+        "clust",
+        projection=fixed_effects.projection(tes, weights, "t"),
+    )
+    assert np.allclose(projected["psi"], psi["psi"], rtol=0, atol=1e-12)
+
+
+def test_projection_least_squares():
+    """The projection solves the normal equations of the untreated sample"""
+    proj = fixed_effects.projection(tes, weights, "t + id")
+    untreated = tes.filter(closed_form.treated().not_())
+    Z0 = np.hstack([_dummies(untreated, "t"), _dummies(untreated, "id")])
+    for term in weights["term"].unique().to_list():
+        w = weights.filter(pl.col("term").eq(term)).join(tes, on="row")
+        Z1 = np.hstack([_dummies(w, "t"), _dummies(w, "id")])
+        b = np.linalg.lstsq(Z0.T @ Z0, Z1.T @ w["weight"].to_numpy(), rcond=None)[0]
+        v = untreated.select("row").join(
+            proj.filter(pl.col("term").eq(term)), on="row", maintain_order="left"
+        )["v"]
+        assert np.allclose(v.to_numpy(), -Z0 @ b, rtol=0, atol=1e-10)
+
+
+@pytest.mark.parametrize("fes", ["t + id", None])
+def test_projection_covariates(fes):
+    """With covariates the projection solves the joint normal equations"""
+    rng = np.random.default_rng(1)
+    tes_x = tes.with_columns(x=pl.Series(rng.normal(size=tes.height)))
+    proj = fixed_effects.projection(tes_x, weights, fes, covariates=["x"])
+    untreated = tes_x.filter(closed_form.treated().not_())
+
+    def _design(data: pl.DataFrame) -> np.ndarray:
+        dummies = [_dummies(data, "t"), _dummies(data, "id")] if fes else []
+        return np.column_stack([*dummies, np.ones(data.height), data["x"]])
+
+    Z0 = _design(untreated)
+    for term in weights["term"].unique().to_list():
+        w = weights.filter(pl.col("term").eq(term)).join(tes_x, on="row")
+        Z1 = _design(w)
+        b = np.linalg.lstsq(Z0.T @ Z0, Z1.T @ w["weight"].to_numpy(), rcond=None)[0]
+        v = untreated.select("row").join(
+            proj.filter(pl.col("term").eq(term)), on="row", maintain_order="left"
+        )["v"]
+        assert np.allclose(v.to_numpy(), -Z0 @ b, rtol=0, atol=1e-10)
+
+
+def test_projection_no_fes():
+    """Without fixed effects the untreated rows have no weight"""
+    proj = fixed_effects.projection(tes, weights, None)
+    untreated = tes.filter(closed_form.treated().not_())
+    assert proj.height == untreated.height * weights["term"].n_unique()
+    assert proj["v"].abs().max() == 0
+
+
+def test_projection_unidentified():
+    """Units without untreated observations have no unit effect"""
+    data = sim.simulate_data(N=60)
+    prepped, _ = prep_data(
+        data, outcome="Y", group="E", time="t", unit="id", columns=["id", "t", "E", "Y"]
+    )
+    tes = closed_form.impute_effects(prepped.with_row_index("row"), time="t")
+    w = assign_weights_sparse(prepped)
+    with pytest.raises(ValueError, match="`id`"):
+        fixed_effects.projection(tes, w, "t + id")
+
+
+@pytest.mark.parametrize("fes", ["t", "t + id", None])
+def test_impute_weighted(fes):
+    """The weighted imputation equals weighted least squares with dummies"""
+    rng = np.random.default_rng(2)
+    data = tes.with_columns(
+        iwtr=pl.col("id").mod(3).add(1), x=pl.Series(rng.normal(size=tes.height))
+    )
+    imputed = fixed_effects.impute(data, "dY", fes, covariates=["x"])
+    untreated = data.filter(closed_form.treated().not_())
+
+    def _design(data: pl.DataFrame) -> np.ndarray:
+        cols = [col.strip() for col in fes.split("+")] if fes else []
+        dummies = [_dummies(data, col) for col in cols]
+        return np.column_stack([*dummies, np.ones(data.height), data["x"]])
+
+    sw = np.sqrt(untreated["iwtr"].cast(pl.Float64).to_numpy())
+    Z0 = _design(untreated) * sw[:, None]
+    b = np.linalg.lstsq(Z0, untreated["dY"].to_numpy() * sw, rcond=None)[0]
+    assert np.allclose(imputed["Yhat"], _design(data) @ b, rtol=0, atol=1e-8)
+    assert np.allclose(imputed["Yadj"], data["dY"] - imputed["Yhat"])
@@ -0,0 +1,97 @@
+"""
+Test incremental SWDD estimates for appended periods.
+"""
+
+import numpy as np
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+import did_sw
+from did_sw import sim
+
+
+np.random.seed(123)
+df = (
+    sim.simulate_data(N=500)
+    .with_columns(w=pl.col("id").mod(3).add(1))
+    # Units with gaps and units entering the panel late
+    .filter(
+        ~(pl.col("id").mod(11).eq(0) & pl.col("t").eq(3)),
+        ~(pl.col("id").mod(13).eq(0) & pl.col("t").le(4)),
+    )
+)
+
+
+@pytest.mark.parametrize("aweight", [None, "w"])
+def test_append_equals_full_estimate(aweight):
+    """Appending periods gives the estimates of the full panel"""
+    kwargs = dict(outcome="Y", group="E", time="t", unit="id", aweight=aweight)
+    state = did_sw.SwddState.fit(df.filter(pl.col("t").le(3)), **kwargs)
+    for period in range(4, df["t"].max() + 1):
+        state.append(df.filter(pl.col("t").eq(period)))
+        full = did_sw.estimate(
+            df.filter(pl.col("t").le(period)),
+            cluster_var="id",
+            fes="t",
+            horizons="all",
+            engine="closed_form",
+            **kwargs,
+        )
+        assert_frame_equal(
+            state.estimates(), full.estimates.select("term", "estimate")
+        )
+    assert state.last_period == df["t"].max()
+
+
+def test_append_errors():
+    """Only a single later period can be appended"""
+    kwargs = dict(outcome="Y", group="E", time="t", unit="id")
+    state = did_sw.SwddState.fit(df.filter(pl.col("t").le(4)), **kwargs)
+    with pytest.raises(ValueError):
+        state.append(df.filter(pl.col("t").eq(4)))
+    with pytest.raises(ValueError):
+        state.append(df.filter(pl.col("t").ge(5)))
+    moved = df.filter(pl.col("t").eq(5)).with_columns(E=pl.col("E").add(1))
+    with pytest.raises(ValueError):
+        state.append(moved)
+
+
+@pytest.mark.parametrize("aweight", [None, "w"])
+@pytest.mark.parametrize("window,step", [(2, 1), (3, 1), (4, 2)])
+def test_rolling_equals_window_estimates(aweight, window, step):
+    """Each rolling window gives the estimates of the filtered panel"""
+    kwargs = dict(outcome="Y", group="E", time="t", unit="id", aweight=aweight)
+    res = did_sw.estimate_rolling(df, window=window, step=step, **kwargs)
+    ends = res["end"].unique().sort().to_list()
+    assert ends == list(range(window, df["t"].max() + 1, step))
+    for end in ends:
+        full = did_sw.estimate(
+            df.filter(pl.col("t").is_between(end - window + 1, end)),
+            cluster_var="id",
+            fes="t",
+            horizons="all",
+            engine="closed_form",
+            **kwargs,
+        )
+        assert_frame_equal(
+            res.filter(pl.col("end").eq(end)).drop("end"),
+            full.estimates.select("term", "estimate"),
+            rel_tol=1e-9,
+        )
+    with pytest.raises(ValueError):
+        did_sw.estimate_rolling(df, window=10, **kwargs)
+
+
+def test_no_controls():
+    """Periods without untreated observations raise"""
+    np.random.seed(123)
+    no_never = sim.simulate_data(N=200, E_is=[2, 3, 4, 5, 6])
+    kwargs = dict(outcome="Y", group="E", time="t", unit="id")
+    state = did_sw.SwddState.fit(no_never.filter(pl.col("t").le(5)), **kwargs)
+    before = state.estimates()
+    with pytest.raises(ValueError, match=r"Periods \[6\]"):
+        state.append(no_never.filter(pl.col("t").eq(6)))
+    assert_frame_equal(state.estimates(), before)
+    with pytest.raises(ValueError, match=r"Periods \[6\]"):
+        did_sw.estimate_rolling(no_never, window=3, **kwargs)
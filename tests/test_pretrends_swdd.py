@@ -229,3 +229,29 @@ def test_pretrends_fes():
     )
 
     assert np.all(se > se_prev)
+
+
+def test_pretrends_native():
+    """Pretrends of `estimate` equal those of the expanded panel"""
+    r = did_sw.estimate(
+        basic,
+        outcome="Y",
+        group="Ei",
+        time="t",
+        unit="i",
+        cluster_var="i",
+        fes="t",
+        pretrends=4,
+    )
+    native = r.estimates.filter(pl.col("term").str.starts_with("pretrend"))
+    assert native["term"].to_list() == [
+        "pretrend2",
+        "pretrend3",
+        "pretrend4",
+        "pretrend5",
+    ]
+    estimate, se = utils.pull_arrays_from_res(
+        results, filter=pl.col("term").str.contains("pretrend")
+    )
+    assert np.allclose(native["estimate"].to_numpy(), estimate)
+    assert np.allclose(native["se"].to_numpy(), se)
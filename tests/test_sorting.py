@@ -0,0 +1,46 @@
+"""
+Test sortedness checks.
+"""
+
+import numpy as np
+import polars as pl
+from polars.testing import assert_frame_equal
+import pytest
+
+import did_sw
+from did_sw import sim
+from did_sw.sorting import assert_sorted, is_sorted_by, sort_by
+
+
+def test_is_sorted_by():
+    df = pl.DataFrame({"a": [1, 1, 2, 2], "b": [1, 2, 0, 1], "s": ["x", "y", "a", "b"]})
+    assert is_sorted_by(df, "a", "b")
+    assert is_sorted_by(df, "a", "s")
+    assert not is_sorted_by(df, "b")
+    assert not is_sorted_by(df.reverse(), "a", "b")
+    assert not is_sorted_by(pl.DataFrame({"a": [1, None]}), "a")
+    assert is_sorted_by(df.head(1), "b")
+
+    assert sort_by(df, "a", "b") is df
+    assert_frame_equal(sort_by(df, "b", "a"), df.sort("b", "a"))
+    with pytest.raises(ValueError):
+        assert_sorted(df, "s")
+
+
+def test_estimate_unsorted_input():
+    """Shuffled and pre-sorted inputs give the same estimates"""
+    np.random.seed(123)
+    df = sim.simulate_data(N=150)
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        fes="t",
+        horizons="all",
+        engine="closed_form",
+    )
+    r = did_sw.estimate(df.sort("id", "t"), **kwargs)
+    r_shuffled = did_sw.estimate(df.sample(fraction=1.0, shuffle=True, seed=1), **kwargs)
+    assert_frame_equal(r.estimates, r_shuffled.estimates)
+    assert_frame_equal(r.data, r_shuffled.data)
@@ -2,14 +2,18 @@
 Test did_imp and did_sw.
 """
 
+import gc
 import re
 
 import numpy as np
 import polars as pl
 import pytest
 
+import did_imp
 import did_sw
 from did_imp import utils
+from did_sw import sim
+from did_sw.validate import never_treated
 
 from did_sw._testing import load_harmon_sim_data
 
@@ -320,3 +324,604 @@ def test_did_sw_catconcovariates():
     est_t, se_t = utils.pull_arrays(test)
     assert np.allclose(estimate, est_t)
     assert np.allclose(se, se_t)
+
+
+def test_did_sw_sparse():
+    """Sparse weights give the same estimates as dense weights"""
+    r = did_sw.estimate(
+        base,
+        outcome="Y",
+        group="E",
+        time="t",
+        cluster_var="id",
+        unit="id",
+        fes="t",
+        horizons="all",
+        sparse=True,
+    )
+    est_t = np.array([0.5010075, 0.9383607, 1.44967, 1.897607, 2.756371, 1.126826])
+    se_t = np.array([0.0536648, 0.0907088, 0.1287393, 0.1831673, 0.2655878, 0.0920831])
+    assert r.estimates["term"].to_list() == ["0", "1", "2", "3", "4", "average"]
+    assert np.allclose(r.estimates["estimate"].to_numpy(), est_t)
+    assert np.allclose(r.estimates["se"].to_numpy(), se_t, atol=1e-6)
+    assert r.mod is None
+    assert r.weights is not None
+
+
+@pytest.mark.parametrize(
+    "fes, covariates",
+    [("t", ["-1 + X1 : C(t)"]), (None, ["X1 : C(t) + C(X2) : C(t)"])],
+)
+def test_did_sw_sparse_covariates(fes, covariates):
+    """Sparse standard errors with covariates equal those of the dense fit"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        cluster_var="id",
+        unit="id",
+        fes=fes,
+        covariates=covariates,
+        horizons="event",
+    )
+    r = did_sw.estimate(base, sparse=True, **kwargs)
+    dense = did_sw.estimate(base, **kwargs)
+    assert np.allclose(r.estimates["estimate"], dense.estimates["estimate"])
+    assert np.allclose(r.estimates["se"], dense.estimates["se"])
+
+
+def test_did_sw_lazy():
+    """LazyFrame input gives the same estimates using only the needed columns"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="id",
+        covariates=["C(X2) : C(t)"],
+        fes="t",
+        horizons="event",
+    )
+    r = did_sw.estimate(base, **kwargs)
+    r_lazy = did_sw.estimate(base.lazy(), **kwargs)
+
+    assert np.allclose(
+        r.estimates["estimate"].to_numpy(), r_lazy.estimates["estimate"].to_numpy()
+    )
+    assert np.allclose(r.estimates["se"].to_numpy(), r_lazy.estimates["se"].to_numpy())
+    assert "X1" not in r_lazy.data.columns
+
+
+def test_did_sw_parquet(tmp_path):
+    """Estimation from scanned Parquet and IPC files equals in-memory"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="id",
+        fes="t",
+        horizons="all",
+    )
+    r = did_sw.estimate(base, **kwargs)
+    base.write_parquet(tmp_path / "base.parquet", row_group_size=100)
+    base.write_ipc(tmp_path / "base.arrow")
+
+    for source in [tmp_path / "*.parquet", tmp_path / "base.arrow"]:
+        r_file = did_sw.estimate_from_parquet(source, **kwargs)
+        assert r_file.N == r.N
+        assert np.allclose(
+            r.estimates["estimate"].to_numpy(),
+            r_file.estimates["estimate"].to_numpy(),
+        )
+        assert np.allclose(
+            r.estimates["se"].to_numpy(), r_file.estimates["se"].to_numpy()
+        )
+
+
+def test_did_sw_closed_form():
+    """Closed form engine reproduces the point estimates of Stata"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="id",
+        fes="t",
+        horizons="all",
+    )
+    r = did_sw.estimate(base, engine="closed_form", **kwargs)
+    est_t = np.array([0.5010075, 0.9383607, 1.44967, 1.897607, 2.756371, 1.126826])
+    se_t = np.array([0.0536648, 0.0907088, 0.1287393, 0.1831673, 0.2655878, 0.0920831])
+    assert np.allclose(r.estimates["estimate"].to_numpy(), est_t)
+    assert np.allclose(r.estimates["se"].to_numpy(), se_t)
+
+    with pytest.raises(ValueError):
+        did_sw.estimate(
+            base, engine="closed_form", covariates=["C(X2) : C(t)"], **kwargs
+        )
+
+
+def test_did_sw_closed_form_se():
+    """Analytic clustered standard errors equal those of the regression"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="clust",
+        fes="t",
+        horizons="all",
+    )
+    r = did_sw.estimate(base, **kwargs)
+    r_cf = did_sw.estimate(base, engine="closed_form", **kwargs)
+    assert r.estimates["term"].to_list() == r_cf.estimates["term"].to_list()
+    for col in ["estimate", "se", "lower", "upper"]:
+        assert np.allclose(r.estimates[col].to_numpy(), r_cf.estimates[col].to_numpy())
+
+
+def test_did_sw_plan():
+    """Specifications of a plan equal separate calls of `estimate`"""
+    plan = (
+        did_sw.EstimationPlan(base, outcome="Y", group="E", time="t", unit="id")
+        .add("basic", cluster_var="id", fes="t", horizons="all")
+        .add("clust", cluster_var="clust", fes="t", horizons="event")
+        .add("catcov", cluster_var="id", covariates=["C(X2) : C(t)"], fes="t")
+        .add("dup", cluster_var="id", fes="t", horizons="all")
+    )
+    res = plan.run(n_jobs=2)
+    assert res["spec"].unique(maintain_order=True).to_list() == [
+        "basic",
+        "clust",
+        "catcov",
+        "dup",
+    ]
+    assert plan.results["basic"] is plan.results["dup"]
+
+    for name, kwargs in [
+        ("basic", dict(cluster_var="id", fes="t", horizons="all")),
+        ("clust", dict(cluster_var="clust", fes="t", horizons="event")),
+        ("catcov", dict(cluster_var="id", covariates=["C(X2) : C(t)"], fes="t")),
+    ]:
+        r = did_sw.estimate(
+            base, outcome="Y", group="E", time="t", unit="id", **kwargs
+        )
+        spec = res.filter(pl.col("spec").eq(name))
+        assert spec["term"].to_list() == r.estimates["term"].to_list()
+        assert np.allclose(spec["estimate"].to_numpy(), r.estimates["estimate"])
+        assert np.allclose(spec["se"].to_numpy(), r.estimates["se"])
+
+
+def test_did_sw_cache():
+    """Cached preprocessing is reused across clusters with equal estimates"""
+    cache = did_sw.cache.LRUCache()
+    kwargs = dict(outcome="Y", group="E", time="t", unit="id", fes="t")
+    for cluster_var in ["id", "clust", "id"]:
+        r = did_sw.estimate(base, cluster_var=cluster_var, cache=cache, **kwargs)
+        r_nc = did_sw.estimate(base, cluster_var=cluster_var, **kwargs)
+        assert np.allclose(r.estimates["estimate"], r_nc.estimates["estimate"])
+        assert np.allclose(r.estimates["se"], r_nc.estimates["se"])
+    assert cache.hits > 0
+
+
+def test_did_sw_retain(tmp_path):
+    """Retention policies of the result"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="id",
+        fes="t",
+        horizons="all",
+        engine="closed_form",
+    )
+    full = did_sw.estimate(base, **kwargs)
+    spill = did_sw.estimate(base, retain="spill", spill_dir=tmp_path, **kwargs)
+    assert spill.data_path is not None and spill.data_path.parent == tmp_path
+    assert spill.data.equals(full.data)
+
+    # Copies share the spill file, which outlives the result that spilled it
+    path, copy = spill.data_path, spill.recluster("id")
+    del spill
+    gc.collect()
+    assert path.exists() and copy.data_path == path
+    assert copy.data.equals(full.data)
+    del copy
+    gc.collect()
+    assert not path.exists()
+
+    lean = did_sw.estimate(base, retain="influence", **kwargs)
+    assert lean.data is None and lean.weights is None
+    assert lean.influence is not None
+    assert lean.estimates.equals(full.estimates)
+
+    lean = did_sw.estimate(base, retain="estimates", **kwargs)
+    assert lean.influence is None
+    assert lean.estimates.equals(full.estimates)
+
+
+def test_did_sw_aweight_compress():
+    """Unit weights equal replicated units and compression is exact"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="clust",
+        fes="t",
+        horizons="all",
+        engine="closed_form",
+    )
+    weighted = base.with_columns(w=pl.col("id").mod(3).add(1))
+    replicated = (
+        weighted.with_columns(rep=pl.int_ranges(0, pl.col("w")))
+        .explode("rep")
+        .with_columns(id=pl.col("id").mul(10).add(pl.col("rep")))
+    )
+    r_rep = did_sw.estimate(replicated, **kwargs)
+    r_w = did_sw.estimate(weighted, aweight="w", **kwargs)
+    r_c = did_sw.estimate(replicated, compress=True, **kwargs)
+    for r in [r_w, r_c]:
+        assert np.allclose(r.estimates["estimate"], r_rep.estimates["estimate"])
+        assert np.allclose(r.estimates["se"], r_rep.estimates["se"])
+    assert r_c.N == r_rep.N
+    assert r_c.data.height < r_rep.data.height
+
+    # The weighted imputation regression equals the weighted closed form
+    r_reg = did_sw.estimate(
+        weighted, aweight="w", **(kwargs | dict(engine="regression"))
+    )
+    assert r_reg.mod is None
+    assert np.allclose(r_reg.estimates["estimate"], r_w.estimates["estimate"])
+    assert np.allclose(r_reg.estimates["se"], r_w.estimates["se"])
+
+
+def test_did_sw_aweight_regression():
+    """Weighted regressions with unit effects equal replicated units"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="clust",
+        fes="t + id",
+        horizons="all",
+    )
+    # Units treated in their first differenced period have no untreated rows
+    panel = base.filter(
+        pl.col("E").gt(base["t"].min() + 1) | never_treated("E", base.schema["E"])
+    )
+    weighted = panel.with_columns(w=pl.col("id").mod(3).add(1))
+    replicated = (
+        weighted.with_columns(rep=pl.int_ranges(0, pl.col("w")))
+        .explode("rep")
+        .with_columns(id=pl.col("id").mul(10).add(pl.col("rep")), w=pl.lit(1))
+    )
+    # Unit weights of one keep the replicated panel on the weighted path, so
+    # the comparison does not depend on the demeaning tolerance of `did_imp`
+    r_rep = did_sw.estimate(replicated, aweight="w", **kwargs)
+    r_w = did_sw.estimate(weighted, aweight="w", **kwargs)
+    assert np.allclose(r_w.estimates["estimate"], r_rep.estimates["estimate"])
+    assert np.allclose(r_w.estimates["se"], r_rep.estimates["se"])
+
+
+def test_did_sw_float32():
+    """Float32 storage agrees with float64 up to the documented tolerance"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="clust",
+        fes="t",
+        horizons="all",
+    )
+    for engine in ["regression", "closed_form"]:
+        r = did_sw.estimate(base, engine=engine, **kwargs)
+        r32 = did_sw.estimate(base, engine=engine, precision="float32", **kwargs)
+        assert r32.data.schema["dY"] == pl.Float32
+        assert r.estimates["term"].to_list() == r32.estimates["term"].to_list()
+        for col in ["estimate", "se"]:
+            assert np.allclose(r32.estimates[col], r.estimates[col], rtol=1e-5)
+
+    with pytest.raises(ValueError):
+        did_sw.estimate(base, precision="float16", **kwargs)
+
+
+def test_did_sw_parallel_cohort():
+    """Estimation split by cohort equals the serial closed form"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="clust",
+        fes="t",
+        horizons="all",
+        engine="closed_form",
+        pretrends=True,
+    )
+    r = did_sw.estimate(base, **kwargs)
+    r_par = did_sw.estimate(base, parallel="cohort", n_jobs=4, **kwargs)
+    assert r.estimates["term"].to_list() == r_par.estimates["term"].to_list()
+    for col in ["estimate", "se", "lower", "upper"]:
+        assert np.allclose(r.estimates[col], r_par.estimates[col])
+    assert r.weights.equals(r_par.weights)
+
+    with pytest.raises(NotImplementedError):
+        did_sw.estimate(
+            base, parallel="cohort", **(kwargs | dict(engine="regression"))
+        )
+
+
+def test_did_sw_bootstrap():
+    """Multiplier bootstrap standard errors approximate the analytic ones"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="clust",
+        fes="t",
+        horizons="all",
+        engine="closed_form",
+    )
+    r = did_sw.estimate(base, bootstrap=999, seed=1, **kwargs)
+    assert np.allclose(r.estimates["se_boot"], r.estimates["se"], rtol=0.15)
+    horizons = r.estimates.filter(pl.col("term").ne("average"))
+    # Uniform bands are wider than the pointwise intervals
+    assert (horizons["lower_band"] < horizons["lower"]).all()
+    assert (horizons["upper_band"] > horizons["upper"]).all()
+    assert r.estimates.filter(pl.col("term").eq("average"))["lower_band"].is_null()[0]
+
+    r_seed = did_sw.estimate(base, bootstrap=999, seed=1, **kwargs)
+    assert r.estimates.equals(r_seed.estimates)
+    r_mammen = did_sw.estimate(
+        base, bootstrap=999, multipliers="mammen", seed=1, **kwargs
+    )
+    assert np.allclose(r_mammen.estimates["se_boot"], r.estimates["se"], rtol=0.15)
+
+    with pytest.raises(NotImplementedError):
+        did_sw.estimate(base, bootstrap=99, **(kwargs | dict(engine="regression")))
+
+
+def test_did_sw_sparse_influence():
+    """The sparse regression keeps the influence of its projection"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="clust",
+        horizons="all",
+        bootstrap=199,
+        seed=1,
+    )
+    r = did_sw.estimate(base, fes="t", sparse=True, **kwargs)
+    r_cf = did_sw.estimate(base, fes="t", engine="closed_form", **kwargs)
+    assert np.allclose(r.estimates["se_boot"], r_cf.estimates["se_boot"])
+    combination = {"0": 0.5, "1": 0.5}
+    assert np.allclose(r.lincom(combination)["se"], r_cf.lincom(combination)["se"])
+    se = r.recluster("id").estimates["se"]
+    assert np.allclose(se, r_cf.recluster("id").estimates["se"])
+
+    # Unit effects are not imputed in closed form
+    panel = base.filter(
+        pl.col("E").gt(base["t"].min() + 1) | never_treated("E", base.schema["E"])
+    )
+    r_fe = did_sw.estimate(panel, fes="t + id", sparse=True, **kwargs)
+    assert r_fe.influence_matrix().height == panel["clust"].n_unique()
+    assert r_fe.estimates["se_boot"].is_not_null().all()
+    with pytest.raises(ValueError, match="closed form"):
+        r_fe.recluster("id")
+    with pytest.raises(ValueError, match="closed form"):
+        r_fe.jackknife()
+
+
+def test_did_sw_lincom():
+    """Linear combinations of the horizons reproduce the aggregate effect"""
+    r = did_sw.estimate(
+        base,
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="clust",
+        fes="t",
+        horizons="all",
+        engine="closed_form",
+    )
+    psi = r.influence_matrix()
+    horizons = r.estimates.filter(pl.col("term").ne("average"))["term"].to_list()
+    assert np.allclose(
+        np.sqrt((psi.select(horizons).to_numpy() ** 2).sum(axis=0)),
+        r.estimates.filter(pl.col("term").is_in(horizons))["se"],
+    )
+
+    # The aggregate effect averages the horizons weighted by treated rows
+    counts = r.data.filter(pl.col("K").ge(0)).group_by("K").agg(n=pl.col("iwtr").sum())
+    weights = {str(k): n / counts["n"].sum() for k, n in counts.iter_rows()}
+    avg = r.lincom(weights, name="average")
+    expected = r.estimates.filter(pl.col("term").eq("average"))
+    for col in ["estimate", "se"]:
+        assert np.allclose(avg[col], expected[col])
+
+    diff = r.lincom({"1": 1, "0": -1})
+    assert np.isclose(diff["estimate"][0], np.diff(r.estimates["estimate"][:2])[0])
+
+    with pytest.raises(ValueError):
+        r.lincom({"horizon0": 1})
+
+
+def test_did_sw_recluster():
+    """Reclustering a result equals estimating with the new clusters"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        fes="t",
+        horizons="all",
+        engine="closed_form",
+        pretrends=True,
+    )
+    r = did_sw.estimate(base, cluster_var="id", **kwargs)
+    r_clust = did_sw.estimate(base, cluster_var="clust", **kwargs)
+    clusters = base.select("id", "clust").unique()
+    for rc in [r.recluster("clust", clusters=clusters), r_clust.recluster("id")]:
+        cluster = rc.influence.columns[1]
+        direct = r_clust if cluster == "clust" else r
+        assert rc.estimates["term"].to_list() == direct.estimates["term"].to_list()
+        for col in ["estimate", "se", "lower", "upper"]:
+            assert np.allclose(rc.estimates[col], direct.estimates[col])
+
+    with pytest.raises(ValueError, match="clusters="):
+        r.recluster("clust")
+    with pytest.raises(ValueError):
+        did_sw.estimate(
+            base, cluster_var="id", retain="estimates", **kwargs
+        ).recluster("id")
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_did_sw_recluster_kept(compress):
+    """Clusters kept at fit time can be reclustered without a table"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        fes="t",
+        horizons="all",
+        engine="closed_form",
+        compress=compress,
+    )
+    r = did_sw.estimate(base, cluster_var="id", clusters="clust", **kwargs)
+    assert "clust" in r.data.columns
+    rc = r.recluster("clust")
+    direct = did_sw.estimate(base, cluster_var="clust", **kwargs)
+    for col in ["estimate", "se", "lower", "upper"]:
+        assert np.allclose(rc.estimates[col], direct.estimates[col])
+
+
+def test_did_sw_by():
+    """Subgroup estimates equal estimates on the filtered groups"""
+    df = base.with_columns(F=pl.col("id").mod(2))
+    for engine in ["regression", "closed_form"]:
+        kwargs = dict(
+            outcome="Y",
+            group="E",
+            time="t",
+            unit="id",
+            cluster_var="id",
+            fes="t",
+            horizons="all",
+            engine=engine,
+        )
+        r = did_sw.estimate(df, by="F", n_jobs=2, **kwargs)
+        assert r.estimates.columns[0] == "F"
+        assert sorted(r.groups) == [(0,), (1,)]
+        assert r.N == sum(res.N for res in r.groups.values())
+        for (f,), res in r.groups.items():
+            r_f = did_sw.estimate(df.filter(pl.col("F").eq(f)), **kwargs)
+            stacked = r.estimates.filter(pl.col("F").eq(f))
+            assert stacked["term"].to_list() == r_f.estimates["term"].to_list()
+            for col in ["estimate", "se"]:
+                assert np.allclose(stacked[col], r_f.estimates[col])
+
+    with pytest.raises(ValueError):
+        did_sw.estimate(df, by="t", **kwargs)
+
+
+def test_did_sw_jackknife():
+    """Downdated leave-out estimates equal estimates without the group"""
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        cluster_var="clust",
+        fes="t",
+        horizons="all",
+        engine="closed_form",
+    )
+    r = did_sw.estimate(base, **kwargs)
+    for by in ["E", "clust"]:
+        jk = r.jackknife(by)
+        assert jk.columns == [by, "term", "estimate"]
+        for g in jk[by].unique().to_list()[:3]:
+            try:
+                r_g = did_sw.estimate(base.filter(pl.col(by).ne(g)), **kwargs)
+            except ValueError:
+                # Leaving out the controls of a period leaves its terms
+                # unidentified
+                assert jk.filter(pl.col(by).eq(g))["estimate"].has_nulls()
+                continue
+            leave_out = (
+                jk.filter(pl.col(by).eq(g))
+                .drop_nulls("estimate")
+                .join(r_g.estimates, on="term", how="inner")
+            )
+            assert leave_out.height == r_g.estimates.height
+            assert np.allclose(leave_out["estimate"], leave_out["estimate_right"])
+
+
+def test_did_sw_closed_form_no_controls():
+    """Treated periods without untreated observations are not identified"""
+    np.random.seed(123)
+    df = sim.simulate_data(N=300, E_is=[2, 3, 4, 5, 6])
+    kwargs = dict(
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        fes="t",
+        horizons="all",
+        engine="closed_form",
+    )
+    with pytest.raises(ValueError, match=r"Periods \[6\]"):
+        did_sw.estimate(df, **kwargs)
+    with pytest.raises(ValueError, match=r"Periods \[6\]"):
+        did_sw.estimate(df, parallel="cohort", **kwargs)
+    # Before the last cohort is treated all effects are identified
+    r = did_sw.estimate(df.filter(pl.col("t").lt(6)), **kwargs)
+    assert r.estimates["estimate"].is_not_null().all()
+    jk = r.jackknife()
+    # Cohort 6 holds the only controls of period 5
+    assert jk.filter(pl.col("E").eq(6))["estimate"].has_nulls()
+
+
+def test_did_sw_cache_imputation(monkeypatch):
+    """A cached sweep over clusters imputes and projects once per specification"""
+    calls = {"tes": 0, "projection": 0}
+    compute_tes = did_imp.compute_tes
+    projection = did_sw.fixed_effects.projection
+
+    def _compute_tes(*args, **kwargs):
+        calls["tes"] += 1
+        return compute_tes(*args, **kwargs)
+
+    def _projection(*args, **kwargs):
+        calls["projection"] += 1
+        return projection(*args, **kwargs)
+
+    monkeypatch.setattr(did_imp, "compute_tes", _compute_tes)
+    monkeypatch.setattr(did_sw.fixed_effects, "projection", _projection)
+    # Units treated in their first differenced period have no untreated rows
+    panel = base.filter(
+        pl.col("E").gt(base["t"].min() + 1) | never_treated("E", base.schema["E"])
+    )
+    cache = did_sw.cache.LRUCache()
+    kwargs = dict(outcome="Y", group="E", time="t", unit="id", horizons="all")
+    specs = [("t", None), ("t + id", None), ("t", ["-1 + X1 : C(t)"])]
+    for fes, covariates in specs:
+        for cluster_var in ["id", "clust"]:
+            spec = dict(fes=fes, covariates=covariates, cluster_var=cluster_var)
+            # The cache runs the regression on the sparse path
+            r = did_sw.estimate(panel, cache=cache, **spec, **kwargs)
+            dense = did_sw.estimate(panel, **spec, **kwargs)
+            assert r.mod is None
+            assert np.allclose(r.estimates["estimate"], dense.estimates["estimate"])
+            assert np.allclose(r.estimates["se"], dense.estimates["se"])
+    assert calls == {"tes": 3, "projection": 3}
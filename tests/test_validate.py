@@ -0,0 +1,114 @@
+"""
+Test the panel validator shared by the estimator and the comparisons.
+"""
+
+import numpy as np
+import polars as pl
+import pytest
+
+import did_sw
+from did_sw import comparison, sim
+from did_sw.cache import LRUCache, default_cache
+from did_sw.validate import validate_panel
+
+
+np.random.seed(123)
+base = sim.simulate_data(N=100)
+
+
+def test_validate_sim():
+    """Simulated data is a valid panel"""
+    diag = validate_panel(base, unit="id", time="t", group="E", treatment="D")
+    assert diag.ok
+    assert diag.n_units == 100 and diag.n_obs == base.height
+    # Gaps are reported but allowed
+    gapped = base.filter(~(pl.col("id").eq(3) & pl.col("t").eq(3)))
+    diag = validate_panel(gapped, unit="id", time="t", group="E", treatment="D")
+    assert diag.gaps == 1 and diag.ok
+
+
+def test_validate_errors():
+    """Each failed check is counted per unit"""
+    bad = pl.concat([base, base.filter(pl.col("id").eq(1)).head(1)]).with_columns(
+        X=pl.when(pl.col("id").eq(2)).then(pl.col("t")).otherwise(0),
+        E=pl.when(pl.col("id").eq(4) & pl.col("t").eq(1))
+        .then(pl.col("E").add(1))
+        .otherwise(pl.col("E")),
+    )
+    treated_id = base.filter(pl.col("E").gt(0) & pl.col("E").lt(6))["id"][0]
+    bad = bad.with_columns(
+        D=pl.when(pl.col("id").eq(treated_id) & pl.col("t").eq(6))
+        .then(0)
+        .otherwise(pl.col("D"))
+    )
+    diag = validate_panel(
+        bad, unit="id", time="t", group="E", treatment="D", constant=["X"]
+    )
+    assert diag.duplicates == 1
+    assert diag.varying == {"X": 1}
+    assert diag.varying_cohort == 1
+    assert diag.non_absorbing == 1
+    # Units 4 and `treated_id` are treated outside their cohort periods
+    assert diag.inconsistent_treatment >= 1
+    with pytest.raises(ValueError, match="duplicate"):
+        diag.raise_for_errors()
+    with pytest.raises(ValueError, match="duplicate"):
+        comparison.comparisons(bad)
+
+
+def test_validate_cache():
+    """Diagnostics are cached on the fingerprint of the checked columns"""
+    cache = LRUCache()
+    kwargs = dict(unit="id", time="t", group="E", cache=cache)
+    diag = validate_panel(base, **kwargs)
+    assert validate_panel(base, **kwargs) is diag
+    # Columns not checked do not change the key
+    assert validate_panel(base.with_columns(Y=0), **kwargs) is diag
+    assert validate_panel(base.with_columns(E=0), **kwargs) is not diag
+
+
+def test_validate_no_shared_cache():
+    """Without caching the shared cache is left untouched"""
+    default_cache.clear()
+    for i in range(5):
+        validate_panel(base.with_columns(Y=i), unit="id", time="t", group="E")
+    did_sw.estimate(
+        base,
+        outcome="Y",
+        group="E",
+        time="t",
+        unit="id",
+        fes="t",
+        engine="closed_form",
+    )
+    assert len(default_cache) == 0
+
+
+def test_estimate_varying_covariate():
+    """Covariates and weights varying within units are rejected"""
+    df = base.with_columns(X=pl.col("t").mod(2), w=pl.col("t"))
+    with pytest.raises(ValueError, match="`X` varies"):
+        did_sw.estimate(
+            df,
+            outcome="Y",
+            group="E",
+            time="t",
+            unit="id",
+            cluster_var="id",
+            fes="t",
+            covariates=["C(X):C(t)"],
+            cache=False,
+        )
+    with pytest.raises(ValueError, match="`w` varies"):
+        did_sw.estimate(
+            df,
+            outcome="Y",
+            group="E",
+            time="t",
+            unit="id",
+            cluster_var="id",
+            fes="t",
+            aweight="w",
+            engine="closed_form",
+            cache=False,
+        )
@@ -0,0 +1,110 @@
+"""
+Test weight construction for the SWDD estimator.
+"""
+
+from functools import reduce
+
+import numpy as np
+import polars as pl
+from polars.testing import assert_frame_equal
+
+import did_sw
+from did_sw import sim
+
+
+np.random.seed(123)
+df = (
+    sim.simulate_data(N=250)
+    .with_columns(E=pl.when(pl.col("E").eq(-99)).then(0).otherwise(pl.col("E")))
+    .sort("id", "t")
+    .with_columns(
+        iwtr=pl.lit(1),
+        dY=pl.col("Y").diff().over("id"),
+        maxK=pl.col("K").max().over("id"),
+    )
+    .drop_nulls(subset="dY")
+)
+
+
+def _assign_weights_horizon_reduce(
+    df: pl.DataFrame,
+    id_col: str = "id",
+    min_K: int = 0,
+    k_vals: list[int] | None = None,
+    prefix: str = "horizon",
+):
+    """Reference implementation with one pass per horizon."""
+
+    def _assign_horizon(df: pl.DataFrame, h: int):
+        return df.with_columns(
+            iwtr_s=pl.col("iwtr").filter(pl.col("K").eq(h)).sum()
+        ).with_columns(
+            pl.col("K")
+            .is_between(0, h, closed="both")
+            .and_(pl.col("maxK").ge(h))
+            .mul(pl.col("iwtr").truediv(pl.col("iwtr_s")))
+            .over(id_col)
+            .alias(f"{prefix}{h}")
+        )
+
+    if not k_vals:
+        maxmaxK = int(df["K"].max())
+        k_vals = list(range(min_K, maxmaxK + 1))
+    return reduce(_assign_horizon, k_vals, df)
+
+
+def test_horizon_weights_single_pass():
+    """Single pass weights equal the weights computed horizon by horizon."""
+    assert_frame_equal(
+        did_sw.assign_weights_horizon(df),
+        _assign_weights_horizon_reduce(df),
+        check_exact=True,
+    )
+
+
+def test_horizon_weights_kvals():
+    """Custom horizons incl. a horizon without any rows and pretrends."""
+    for kwargs in [
+        dict(k_vals=[0, 2, 7]),
+        dict(min_K=-1, prefix="pretrend"),
+    ]:
+        assert_frame_equal(
+            did_sw.assign_weights_horizon(df, **kwargs),
+            _assign_weights_horizon_reduce(df, **kwargs),
+            check_exact=True,
+        )
+
+
+def test_sparse_weights_equal_dense():
+    """Sparse triplets hold exactly the non-zero entries of the dense weights."""
+    dense = did_sw.assign_weights_horizon(df).pipe(did_sw.assign_weights_agg)
+    cols = dense.select(pl.selectors.matches("horizon|average")).columns
+    sparse = did_sw.assign_weights_sparse(df, average=True)
+
+    assert sparse["term"].unique(maintain_order=True).to_list() == cols
+    assert_frame_equal(
+        sparse,
+        did_sw.sparse_weights_from_columns(dense, cols).sort(
+            pl.col("term").replace_strict(cols, list(range(len(cols)))), "row"
+        ),
+        check_exact=True,
+        check_dtypes=False,
+    )
+
+
+def test_weights_float32():
+    """Float32 weights are the float64 weights rounded to float32."""
+    dense = did_sw.assign_weights_horizon(df).pipe(did_sw.assign_weights_agg)
+    dense32 = did_sw.assign_weights_horizon(df, precision="float32").pipe(
+        did_sw.assign_weights_agg, precision="float32"
+    )
+    cols = [col for col in dense.columns if col.startswith("horizon")]
+    cols += ["a2w", "average"]
+    assert all(dense32.schema[col] == pl.Float32 for col in cols)
+    assert_frame_equal(dense32.select(cols), dense.select(cols).cast(pl.Float32))
+
+    sp = did_sw.assign_weights_sparse(df, average=True, precision="float32")
+    assert sp.schema["weight"] == pl.Float32
+    assert_frame_equal(
+        sp, did_sw.assign_weights_sparse(df, average=True).cast({"weight": pl.Float32})
+    )